@@ -143,9 +143,22 @@ def _update_presentation_xml(root, rel_ids):
         root.remove(notes_master_lst)
 
 
-def build_from_json(template_path, json_path, output_path):
-    """复制原始模板 pptx，并按 JSON 顺序重新组织 slide 文件"""
-    data = json.loads(Path(json_path).read_text(encoding="utf-8"))
+def load_template_parts(template_path):
+    """将模板 PPT 的所有文件读入内存，返回 {zip 内路径: 字节}，可提前在后台线程加载"""
+    with zipfile.ZipFile(template_path, "r") as tmpl_zip:
+        return {name: tmpl_zip.read(name) for name in tmpl_zip.namelist()}
+
+
+def build_from_json(
+    template_path, json_path, output_path, template_parts=None, data=None
+):
+    """复制原始模板 pptx，并按 JSON 顺序重新组织 slide 文件
+
+    template_parts 为 load_template_parts 预先读取的模板内容，传入时不再重复读取模板。
+    data 为已在内存中的 JSON 内容，传入时不再读取并解析 json_path。
+    """
+    if data is None:
+        data = json.loads(Path(json_path).read_text(encoding="utf-8"))
     pages = data.get("ppt_pages", [])
     if not pages:
         raise ValueError("JSON 中未找到 ppt_pages 内容")
@@ -155,8 +168,9 @@ def build_from_json(template_path, json_path, output_path):
         shutil.copyfile(template_path, temp_copy)
 
         # 将模板 PPT 的所有文件读入内存，便于自由重写
-        with zipfile.ZipFile(template_path, "r") as tmpl_zip:
-            file_bytes = {name: tmpl_zip.read(name) for name in tmpl_zip.namelist()}
+        if template_parts is None:
+            template_parts = load_template_parts(template_path)
+        file_bytes = template_parts
 
         slide_map = {}
         slide_rel_map = {}
@@ -1042,15 +1042,16 @@ def choose_llm(
     provider: str,
     model: Optional[str],
     base_url: Optional[str] = None,
+    api_key: Optional[str] = None,
 ) -> Optional[BaseLLM]:
     if not enable:
         return None
     provider = (provider or "").lower()
 
     if provider == "deepseek":
-        return DeepSeekLLM(model=model or "deepseek-chat")
+        return DeepSeekLLM(api_key=api_key, model=model or "deepseek-chat")
     if provider == "local":
-        return LocalLLM(model=model)
+        return LocalLLM(model=model, api_key=api_key)
     if provider == "qwen":
         endpoint = base_url or os.getenv("QWEN_VLLM_BASE_URL")
         if not endpoint:
@@ -1060,10 +1061,10 @@ def choose_llm(
         return QwenVLLM(base_url=endpoint)
     if provider == "taichu":
         final_model = model or "taichu4_vl_32b"
-        return TaichuLLM(model=final_model, base_url=base_url)
+        return TaichuLLM(api_key=api_key, model=final_model, base_url=base_url)
     if provider == "glm" or provider == "zhipu":
         final_model = model or "glm-4.5v"
-        return GLMLLM(model=final_model, base_url=base_url)
+        return GLMLLM(api_key=api_key, model=final_model, base_url=base_url)
     raise ValueError(f"暂不支持的大模型提供商：{provider}")
 
 
@@ -1323,8 +1324,12 @@ def generate_config_data(
     metadata_overrides: Optional[Dict[str, str]],
     run_dir: Path,
     user_prompt: Optional[str] = None,
+    llm_api_key: Optional[str] = None,
 ) -> Dict:
-    """核心逻辑：生成 JSON 内容，供 GUI/CLI 复用。"""
+    """核心逻辑：生成 JSON 内容，供 GUI/CLI 复用。
+
+    llm_api_key 显式传入时优先于环境变量，便于多个生成任务并发时各用各的密钥。
+    """
     metadata_overrides = metadata_overrides or {}
     image_dir = run_dir / "images"
     blocks, has_marker, metadata = parse_docx_blocks(docx_path, image_dir)
@@ -1333,7 +1338,7 @@ def generate_config_data(
             metadata[key] = metadata_overrides[key]
 
     templates = load_template_defs(template_json, template_list)
-    llm = choose_llm(use_llm, llm_provider, llm_model, llm_base_url)
+    llm = choose_llm(use_llm, llm_provider, llm_model, llm_base_url, llm_api_key)
 
     # 统一走预处理流程：
     # - 如果已有标记：保持分页，只优化文本
@@ -313,6 +313,7 @@ def ai_enrich_template(
     llm_provider: str = "deepseek",
     llm_model: Optional[str] = None,
     llm_base_url: Optional[str] = None,
+    llm_api_key: Optional[str] = None,
 ) -> Dict:
     """使用 AI 自动填充模板配置中的 hint、required、max_chars 和 notes 字段。
 
@@ -321,6 +322,7 @@ def ai_enrich_template(
         llm_provider: LLM 提供商 (deepseek/local/qwen)
         llm_model: LLM 模型名称
         llm_base_url: LLM 服务器地址
+        llm_api_key: LLM API 密钥（不传时各客户端从环境变量读取）
 
     Returns:
         填充后的模板数据
@@ -336,9 +338,9 @@ def ai_enrich_template(
     llm: BaseLLM
     provider = llm_provider.lower()
     if provider == "deepseek":
-        llm = DeepSeekLLM(model=llm_model or "deepseek-chat")
+        llm = DeepSeekLLM(api_key=llm_api_key, model=llm_model or "deepseek-chat")
     elif provider == "local":
-        llm = LocalLLM(model=llm_model, base_url=llm_base_url)
+        llm = LocalLLM(model=llm_model, base_url=llm_base_url, api_key=llm_api_key)
     elif provider == "qwen":
         if not llm_base_url:
             llm_base_url = os.getenv("QWEN_VLLM_BASE_URL")
@@ -19,6 +19,11 @@ from pptx.util import Pt
 
 from archive.generatePPT_template import build_from_json
 
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时使用标准库 json
+    orjson = None
+
 
 SUFFIXES = ("区", "框", "栏")
 PLACEHOLDER_KEYWORDS = ("文字内容", "字幕", "标题名称", "内容内容")
@@ -600,13 +605,24 @@ def _restore_connectors(pptx_path: Path, connectors):
             dst.writestr(name, data)
 
 
+def _dump_config_bytes(config: Dict) -> bytes:
+    """把配置序列化为 UTF-8 JSON（2 空格缩进），安装了 orjson 时使用 orjson。"""
+    if orjson is not None:
+        return orjson.dumps(config, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(config, ensure_ascii=False, indent=2).encode("utf-8")
+
+
 def render_slides(
     template_path: Path,
     config: Dict,
     output_name: str,
     run_dir: Optional[Path] = None,
+    template_parts: Optional[Dict[str, bytes]] = None,
 ) -> Dict:
-    """渲染入口，供 GUI/CLI 复用，返回 PPT 路径和 run 目录信息。"""
+    """渲染入口，供 GUI/CLI 复用，返回 PPT 路径和 run 目录信息。
+
+    template_parts 可传入 load_template_parts 预加载的模板内容，避免渲染时再读取模板。
+    """
     pages = config.get("ppt_pages", [])
     if not pages:
         raise ValueError("JSON 数据中没有 ppt_pages 内容。")
@@ -619,12 +635,11 @@ def render_slides(
         temp_ppt = Path(tmp.name)
 
     try:
+        # config.json 留在 run 目录供下载/存档，构建时直接使用内存中的配置，不再读回解析
         tmp_json = run_dir / "config.json"
-        tmp_json.write_text(
-            json.dumps(config, ensure_ascii=False, indent=2), encoding="utf-8"
-        )
+        tmp_json.write_bytes(_dump_config_bytes(config))
 
-        build_from_json(template_path, tmp_json, temp_ppt)
+        build_from_json(template_path, tmp_json, temp_ppt, template_parts, data=config)
         connector_snapshots = _extract_connectors(temp_ppt)
         prs = Presentation(temp_ppt)
         if len(prs.slides) != len(pages):
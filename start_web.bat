@@ -5,5 +5,6 @@ cd web
 python manage.py makemigrations
 python manage.py migrate
 python manage.py init_users
+python manage.py fail_orphaned_generations
 python manage.py runserver 0.0.0.0:8000
 
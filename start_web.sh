@@ -27,6 +27,9 @@ python manage.py migrate
 echo "👥 初始化默认用户..."
 python manage.py init_users
 
+# 上次退出时未完成的生成任务不会再执行，标记为失败
+python manage.py fail_orphaned_generations
+
 # 启动开发服务器
 echo ""
 echo "✅ 启动开发服务器..."
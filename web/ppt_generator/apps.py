@@ -9,3 +9,7 @@ class PptGeneratorConfig(AppConfig):
     name = 'ppt_generator'
     verbose_name = 'PPT生成器'
 
+    def ready(self):
+        # 注册用户组变更时清除开发者判断缓存的信号
+        from . import middleware  # noqa: F401
+
@@ -1,17 +1,15 @@
 """Context processors for ppt_generator app."""
 
+from .middleware import user_is_developer
+
 
 def user_role(request):
     """Add user role information to all templates."""
-    is_developer = False
-    
-    if request.user.is_authenticated:
-        is_developer = (
-            request.user.groups.filter(name="开发者").exists() 
-            or request.user.is_superuser
-        )
-    
+    # IsDeveloperMiddleware 已在请求上缓存了判断结果，这里直接复用，避免重复查询用户组
+    is_developer = getattr(request, "is_developer", None)
+    if is_developer is None:
+        is_developer = user_is_developer(request.user)
+
     return {
         "is_developer": is_developer,
     }
-
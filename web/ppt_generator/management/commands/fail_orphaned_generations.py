@@ -0,0 +1,29 @@
+"""
+Management command to mark generation jobs orphaned by a restart as failed.
+"""
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ppt_generator.models import PPTGeneration
+
+
+class Command(BaseCommand):
+    help = "把服务重启前未完成（排队中/生成中）的 PPT 生成任务标记为失败"
+
+    def handle(self, *args, **options):
+        # 生成任务在进程内线程池中执行，进程退出后排队和进行中的任务都不会再被执行；
+        # 只能在启动 Web 进程之前运行，否则会把正在执行的任务误标为失败
+        count = PPTGeneration.objects.filter(
+            status__in=["pending", "processing"]
+        ).update(
+            status="failed",
+            error_message="服务重启，任务已中断，请重新提交",
+            updated_at=timezone.now(),
+        )
+        if count:
+            self.stdout.write(
+                self.style.WARNING(f"⚠️  已将 {count} 个中断的生成任务标记为失败")
+            )
+        else:
+            self.stdout.write("ℹ️  没有中断的生成任务")
@@ -0,0 +1,73 @@
+"""
+Middleware for PPT Generator application.
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed
+from django.utils.functional import SimpleLazyObject
+
+# 普通用户的开发者判断结果缓存时长（用户组变更时清除；组改名/删除最多滞后这么久）
+DEVELOPER_CACHE_TIMEOUT = 60
+
+
+def _developer_cache_key(user_id) -> str:
+    return f"s2s:is_developer:{user_id}"
+
+
+def user_is_developer(user) -> bool:
+    """判断用户是否为开发者（超级用户或属于“开发者”组）。
+
+    用户组查询结果按用户缓存，轮询状态等高频请求不必每次都查库。
+    """
+    if not user.is_authenticated:
+        return False
+    if user.is_superuser:
+        return True
+
+    key = _developer_cache_key(user.pk)
+    is_developer = cache.get(key)
+    if is_developer is None:
+        is_developer = user.groups.filter(name="开发者").exists()
+        cache.set(key, is_developer, DEVELOPER_CACHE_TIMEOUT)
+    return is_developer
+
+
+def _clear_developer_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    """用户组成员变化时清除相关用户的缓存。"""
+    if not reverse:
+        # instance 是用户
+        if action in ("post_add", "post_remove", "post_clear"):
+            cache.delete(_developer_cache_key(instance.pk))
+        return
+
+    # instance 是用户组
+    if action == "pre_clear":
+        pk_set = instance.user_set.values_list("pk", flat=True)
+    elif action not in ("post_add", "post_remove"):
+        return
+    cache.delete_many([_developer_cache_key(pk) for pk in pk_set])
+
+
+m2m_changed.connect(
+    _clear_developer_cache,
+    sender=get_user_model().groups.through,
+    dispatch_uid="ppt_generator.clear_developer_cache",
+)
+
+
+class IsDeveloperMiddleware:
+    """在 request 上挂载 is_developer，同一请求内最多查询一次用户组。
+
+    使用惰性对象，只有视图或模板真正用到时才会查询数据库。
+    需放在 AuthenticationMiddleware 之后。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.is_developer = SimpleLazyObject(
+            lambda: user_is_developer(request.user)
+        )
+        return self.get_response(request)
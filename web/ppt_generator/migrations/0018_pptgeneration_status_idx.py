@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-15 22:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ppt_generator', '0017_pptgeneration_user_created_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pptgeneration',
+            index=models.Index(fields=['status'], name='pptgen_status_idx'),
+        ),
+    ]
@@ -3,10 +3,19 @@ Models for PPT Generator application.
 """
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.utils import timezone
 
+# 默认 LLM 配置的缓存键与时长（配置保存/删除时清除）
+LLM_CONFIG_CACHE_KEY = "s2s:global_llm_config:default"
+LLM_MULTIMODAL_CONFIG_CACHE_KEY = "s2s:global_llm_config:multimodal"
+LLM_CONFIG_CACHE_TIMEOUT = 300
+_CACHE_MISS = object()
+
 
 class GlobalLLMConfig(models.Model):
     """全局LLM配置 - 支持多个配置，可选择默认配置"""
@@ -99,7 +108,14 @@ class GlobalLLMConfig(models.Model):
                     pk=self.pk
                 ).update(is_multimodal_default=False)
 
-        return super().save(*args, **kwargs)
+        result = super().save(*args, **kwargs)
+        self.clear_cached_configs()
+        return result
+
+    @staticmethod
+    def clear_cached_configs():
+        """清除缓存的默认配置（任意配置变化都可能影响默认配置的选取）"""
+        cache.delete_many([LLM_CONFIG_CACHE_KEY, LLM_MULTIMODAL_CONFIG_CACHE_KEY])
 
     def get_model_for_provider(self):
         """根据提供商返回正确的模型名称"""
@@ -126,7 +142,21 @@ class GlobalLLMConfig(models.Model):
 
     @classmethod
     def get_config(cls):
-        """获取默认配置（如果不存在则创建默认配置）"""
+        """获取默认配置（如果不存在则创建默认配置）
+
+        结果缓存 LLM_CONFIG_CACHE_TIMEOUT 秒，配置保存或删除时清除。
+        """
+        config = cache.get(LLM_CONFIG_CACHE_KEY)
+        if config is not None:
+            return config
+
+        config = cls._get_or_create_default()
+        cache.set(LLM_CONFIG_CACHE_KEY, config, LLM_CONFIG_CACHE_TIMEOUT)
+        return config
+
+    @classmethod
+    def _get_or_create_default(cls):
+        """从数据库获取默认配置（如果不存在则创建默认配置）"""
         # 尝试获取默认配置
         config = cls.objects.filter(is_default=True).first()
         if config:
@@ -150,7 +180,21 @@ class GlobalLLMConfig(models.Model):
 
     @classmethod
     def get_multimodal_config(cls):
-        """获取默认多模态配置"""
+        """获取默认多模态配置，没有可用配置时返回 None
+
+        结果（包括 None）缓存 LLM_CONFIG_CACHE_TIMEOUT 秒，配置保存或删除时清除。
+        """
+        config = cache.get(LLM_MULTIMODAL_CONFIG_CACHE_KEY, _CACHE_MISS)
+        if config is not _CACHE_MISS:
+            return config
+
+        config = cls._find_multimodal_config()
+        cache.set(LLM_MULTIMODAL_CONFIG_CACHE_KEY, config, LLM_CONFIG_CACHE_TIMEOUT)
+        return config
+
+    @classmethod
+    def _find_multimodal_config(cls):
+        """从数据库查找默认多模态配置"""
         # 尝试获取多模态默认配置
         config = cls.objects.filter(is_multimodal_default=True).first()
         if config:
@@ -169,6 +213,12 @@ class GlobalLLMConfig(models.Model):
         return f"{self.name} ({self.llm_provider} - {self.llm_model}){default_mark}"
 
 
+@receiver(post_delete, sender=GlobalLLMConfig)
+def _clear_llm_config_cache(sender, **kwargs):
+    """删除配置（包括后台批量删除）后清除缓存。"""
+    GlobalLLMConfig.clear_cached_configs()
+
+
 class PPTGeneration(models.Model):
     """Track PPT generation history."""
 
@@ -289,6 +339,12 @@ class PPTGeneration(models.Model):
         verbose_name = "PPT生成记录"
         verbose_name_plural = "PPT生成记录"
         ordering = ["-created_at"]
+        indexes = [
+            # 首页“最近生成”和历史记录页：按用户过滤并按创建时间倒序
+            models.Index(fields=["user", "-created_at"], name="pptgen_user_created_idx"),
+            # 后台按状态筛选（如查找处理中/失败的任务）
+            models.Index(fields=["status"], name="pptgen_status_idx"),
+        ]
 
     def __str__(self):
         return f"PPT生成 #{self.id} - {self.get_status_display()} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
@@ -396,15 +452,20 @@ class TemplateEditSession(models.Model):
     @property
     def progress_summary(self):
         """返回进度摘要字符串"""
-        data = self.progress_data or {}
-        if self.editor_type == "ppt":
+        return self.summarize_progress(self.editor_type, self.progress_data)
+
+    @staticmethod
+    def summarize_progress(editor_type, progress_data):
+        """根据编辑器类型和进度数据生成摘要（供 .values() 查询结果直接使用）"""
+        data = progress_data or {}
+        if editor_type == "ppt":
             named = data.get("named_count", 0)
             total = data.get("total_count", 0)
             if total > 0:
                 percent = int(named / total * 100)
                 return f"{named}/{total} 已命名 ({percent}%)"
             return "未开始"
-        elif self.editor_type == "config":
+        elif editor_type == "config":
             pages = data.get("page_count", 0)
             filled = data.get("filled_count", 0)
             return f"{pages} 页, {filled} 个字段已填充"
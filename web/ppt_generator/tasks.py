@@ -0,0 +1,499 @@
+"""
+Background generation tasks for PPT Generator application.
+
+生成任务在进程内的线程池中执行：视图提交任务后立即返回，前端通过 check_status 轮询状态。
+模板向导的预览图生成（LibreOffice 转换）同样在后台执行，前端通过 template_preview_status 轮询。
+"""
+
+import os
+import sys
+import json
+import hashlib
+import logging
+import shutil
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+from django.conf import settings
+from django.core.files import File
+from django.db import connection
+
+from .models import GlobalLLMConfig, PPTGeneration
+from .utils import (
+    annotate_screenshots,
+    convert_ppt_to_images,
+    dumps_json,
+    extract_shapes_info,
+    preview_dpi,
+)
+
+logger = logging.getLogger(__name__)
+
+# 生成任务线程池：限制同时运行的生成任务数（S2S_GENERATION_WORKERS），超出的任务排队等待
+_GENERATION_EXECUTOR = ThreadPoolExecutor(
+    max_workers=getattr(settings, "S2S_GENERATION_WORKERS", 2),
+    thread_name_prefix="ppt-generation",
+)
+
+# 预览图生成线程池：LibreOffice 转换很重，同时只跑少量任务
+_PREVIEW_EXECUTOR = ThreadPoolExecutor(
+    max_workers=getattr(settings, "S2S_PREVIEW_WORKERS", 1),
+    thread_name_prefix="template-preview",
+)
+
+# 临时目录清理线程池：删除会话目录（大量预览图）不阻塞请求
+_CLEANUP_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dir-cleanup")
+
+# 预览生成状态写在会话目录下的文件里（多进程部署时各 worker 都能读到）
+PREVIEW_STATUS_FILE = "preview_status"
+PREVIEW_PENDING = "pending"
+PREVIEW_READY = "ready"
+PREVIEW_FAILED = "failed"
+
+# 预览图缓存目录（MEDIA_ROOT 下），按 PPT 内容的 SHA-256 分目录存放；
+# 每个目录下有 images/（标注好的预览图）和 shapes.json（extract_shapes_info 的 "none" 模式结果）
+PREVIEW_CACHE_DIR = "preview_cache"
+PREVIEW_SHAPES_FILE = "shapes.json"
+# 会话目录下记录 PPT 内容哈希及当时文件版本的文件，编辑器据此查缓存，不必在请求中重新哈希
+PREVIEW_DIGEST_FILE = "preview_digest.json"
+# 预览缓存最多保留的条目数（S2S_PREVIEW_CACHE_MAX_ENTRIES），超出时删除最久未使用的
+PREVIEW_CACHE_MAX_ENTRIES = getattr(settings, "S2S_PREVIEW_CACHE_MAX_ENTRIES", 100)
+# 写缓存中途崩溃留下的临时目录，超过该时长（秒）后清理
+_PREVIEW_CACHE_TMP_MAX_AGE = 60 * 60
+# 计算预览缓存键（PPT 内容哈希）、复制生成文件时的分块大小
+_IO_CHUNK_SIZE = 1 << 20
+
+
+class _LargeChunkFile(File):
+    """按 1MB 分块读取的 File（Django 默认 64KB），存储后端复制时循环次数更少。"""
+
+    DEFAULT_CHUNK_SIZE = _IO_CHUNK_SIZE
+
+
+@lru_cache(maxsize=None)
+def _pipeline():
+    """首次执行生成任务时才导入 S2S 生成脚本。
+
+    docx_to_config 会连带导入 python-docx 和 LLM 客户端，放到模块顶层会拖慢每个
+    worker 的启动和开发服务器的自动重载，而多数请求根本用不到它们。
+
+    Returns:
+        (generate_config_data, load_template_parts, render_slides)
+    """
+    # Add parent directory to path to import S2S modules
+    if str(settings.BASE_DIR.parent) not in sys.path:
+        sys.path.insert(0, str(settings.BASE_DIR.parent))
+    from archive.generatePPT_template import load_template_parts
+    from scripts.docx_to_config import generate_config_data
+    from scripts.generate_slides import render_slides
+
+    return generate_config_data, load_template_parts, render_slides
+
+
+def _guess_template_json(template_path: Path) -> Path:
+    """根据模板 PPT 路径自动推断对应的 template.json 配置文件路径。
+
+    优先级：
+    1. 与 PPT 同名的 JSON（同文件夹）：<folder>/<stem>.json
+    2. 同文件夹下的 template.json
+    3. 全局模板目录下的 template.json（兼容老行为）
+
+    结果按所在目录的 mtime 缓存：目录内增删文件会改变 mtime，使旧结果自然失效。
+    """
+    try:
+        parent_mtime = os.stat(template_path.parent).st_mtime_ns
+    except FileNotFoundError:
+        parent_mtime = None
+    return Path(
+        _guess_template_json_cached(
+            str(template_path), parent_mtime, str(settings.S2S_TEMPLATE_DIR)
+        )
+    )
+
+
+@lru_cache(maxsize=256)
+def _guess_template_json_cached(
+    template_path: str, parent_mtime: Optional[int], base_dir: str
+) -> str:
+    """_guess_template_json 的缓存实现（未命中的回退结果同样会被缓存）。"""
+    template_path = Path(template_path)
+    # 一次 scandir 拿到同目录下的全部文件名，代替逐个候选 stat
+    parent = template_path.parent
+    try:
+        with os.scandir(parent) as it:
+            names = {entry.name for entry in it if entry.is_file()}
+    except FileNotFoundError:
+        names = set()
+
+    # 1) 同名 JSON：template1/template.pptx -> template1/template.json
+    same_name = f"{template_path.stem}.json"
+    if same_name in names:
+        return str(parent / same_name)
+
+    # 2) 同目录下的 template.json
+    if "template.json" in names:
+        return str(parent / "template.json")
+
+    # 3) 全局默认 template.json；都不存在时仍返回该路径，让后续报出清晰错误
+    return str(Path(base_dir) / "template.json")
+
+
+def clear_template_json_cache():
+    """清空 template.json 推断缓存（发布/修改模板后调用）。"""
+    _guess_template_json_cached.cache_clear()
+
+
+def _stat_or_raise(path: Path, message: str) -> os.stat_result:
+    """对文件执行一次 stat，不存在时抛出带中文提示的 FileNotFoundError。
+
+    用单次 stat 代替 exists() 探测后再使用。
+    """
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"{message}: {path}") from None
+
+
+def _store_generated_file(field_file, filename: str, src_path: Path) -> None:
+    """把运行目录中的生成文件挂到 FileField 上（不保存模型）。
+
+    本地存储时直接硬链接到存储路径，省去一次完整的读写；跨文件系统时用
+    shutil.copyfile（Linux 上走 sendfile，在内核内完成复制）；
+    非本地存储时退回按 1MB 分块复制。
+    """
+    storage = field_file.storage
+    name = field_file.field.generate_filename(field_file.instance, filename)
+    try:
+        name = storage.get_available_name(name)
+        target = Path(storage.path(name))
+    except NotImplementedError:
+        with open(src_path, "rb") as f:
+            field_file.save(filename, _LargeChunkFile(f), save=False)
+        return
+    target.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(src_path, target)
+    except OSError:
+        shutil.copyfile(src_path, target)
+    field_file.name = name
+
+
+def run_generation(generation_id):
+    """Background task to run PPT generation."""
+    # 关闭当前线程的数据库连接，让它创建新的连接
+    connection.close()
+
+    try:
+        # 预设 LLM 配置在下面会被多次访问，随生成记录一起取出
+        generation = PPTGeneration.objects.select_related("llm_preset_config").get(
+            pk=generation_id
+        )
+
+        # Determine template path
+        if generation.template_file:
+            template_path = Path(generation.template_file.path)
+        else:
+            template_path = settings.S2S_TEMPLATE_DIR / generation.template_name
+
+        _stat_or_raise(template_path, "模板文件不存在")
+
+        # Prepare paths
+        docx_path = Path(generation.docx_file.path)
+
+        # Determine template.json config: uploaded file > dropdown selection > auto-guess
+        if generation.config_template_file:
+            template_json = Path(generation.config_template_file.path)
+        elif generation.config_template:
+            template_json = settings.S2S_TEMPLATE_DIR / generation.config_template
+        else:
+            template_json = _guess_template_json(template_path)
+
+        _stat_or_raise(template_json, "配置模板不存在")
+        _stat_or_raise(docx_path, "讲稿文件不存在")
+
+        # template.txt 是可选的，不存在时生成脚本会忽略它
+        template_list = settings.S2S_TEMPLATE_DIR / "template.txt"
+
+        # Create run directory
+        run_dir = settings.S2S_TEMP_DIR / f"web-{generation.id}"
+        run_dir.mkdir(parents=True, exist_ok=True)
+
+        # Prepare metadata overrides
+        metadata_overrides = {
+            "course": generation.course_name,
+            "college": generation.college_name,
+            "lecturer": generation.lecturer_name,
+        }
+
+        # Prepare LLM configuration
+        if generation.use_llm:
+            if (
+                generation.llm_config_choice == "preset"
+                and generation.llm_preset_config
+            ):
+                preset = generation.llm_preset_config
+                llm_provider = preset.llm_provider
+                llm_model = preset.get_model_for_provider()
+                llm_api_key = preset.llm_api_key
+                llm_base_url = preset.llm_base_url
+                user_prompt = generation.user_prompt or preset.default_prompt
+            else:
+                llm_provider = generation.llm_provider
+                llm_model = generation.llm_model
+                llm_api_key = generation.llm_api_key
+                llm_base_url = generation.llm_base_url
+                user_prompt = generation.user_prompt
+
+                if not llm_provider or not llm_api_key:
+                    global_config = GlobalLLMConfig.get_config()
+                    llm_provider = llm_provider or global_config.llm_provider
+                    llm_model = llm_model or global_config.get_model_for_provider()
+                    llm_api_key = llm_api_key or global_config.llm_api_key
+                    llm_base_url = llm_base_url or global_config.llm_base_url
+                    user_prompt = user_prompt or global_config.default_prompt
+        else:
+            llm_provider = None
+            llm_model = None
+            llm_base_url = None
+            llm_api_key = None
+            user_prompt = None
+
+        generate_config_data, load_template_parts, render_slides = _pipeline()
+
+        # Step 1: Generate config JSON
+        # 生成配置主要耗时在 LLM 调用上，同时在后台线程预先读取模板 PPT
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            template_future = executor.submit(load_template_parts, template_path)
+            config_data = generate_config_data(
+                docx_path=str(docx_path),
+                template_json=str(template_json),
+                template_list=str(template_list),
+                use_llm=generation.use_llm,
+                llm_provider=llm_provider,
+                llm_model=llm_model,
+                llm_base_url=llm_base_url,
+                metadata_overrides=metadata_overrides,
+                run_dir=run_dir,
+                user_prompt=user_prompt,
+                llm_api_key=llm_api_key,
+            )
+            template_parts = template_future.result()
+
+        # Step 2: Render slides（render_slides 会把配置写入 run_dir/config.json）
+        result = render_slides(
+            template_path=template_path,
+            config=config_data,
+            output_name="slides.pptx",
+            run_dir=run_dir,
+            template_parts=template_parts,
+        )
+
+        output_path = result["output_path"]
+        config_path = run_dir / "config.json"
+
+        # Save output files to model
+        _store_generated_file(
+            generation.output_ppt, f"generation_{generation.id}.pptx", output_path
+        )
+        _store_generated_file(
+            generation.config_json, f"config_{generation.id}.json", config_path
+        )
+
+        generation.mark_completed(
+            output_path=generation.output_ppt.name,
+            config_path=generation.config_json.name,
+            run_dir=run_dir,
+        )
+
+        logger.info("[Generation %s] 完成", generation_id)
+
+    except Exception as e:
+        logger.exception("[Generation %s] 失败", generation_id)
+        error_msg = str(e)
+        if settings.DEBUG:
+            error_msg = f"{error_msg}\n\n{traceback.format_exc()}"
+        try:
+            generation = PPTGeneration.objects.get(pk=generation_id)
+            generation.mark_failed(error_msg)
+        except Exception:
+            pass
+    finally:
+        # 线程池中的线程会被复用，任务结束后释放本线程的数据库连接
+        connection.close()
+
+
+def enqueue_generation(generation_id):
+    """把生成任务提交到后台线程池，返回 Future。"""
+    return _GENERATION_EXECUTOR.submit(run_generation, generation_id)
+
+
+def _write_preview_status(session_dir: Path, status: str) -> None:
+    (session_dir / PREVIEW_STATUS_FILE).write_text(status, encoding="utf-8")
+
+
+def read_preview_status(session_dir: Path) -> Optional[str]:
+    """返回会话目录的预览生成状态；目录不存在时返回 None。
+
+    没有状态文件的旧会话（或上传解析生成的会话）视为已就绪。
+    """
+    try:
+        return (session_dir / PREVIEW_STATUS_FILE).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return PREVIEW_READY if session_dir.is_dir() else None
+
+
+def _file_sha256(path: Path) -> str:
+    """分块计算文件内容的 SHA-256。"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_IO_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _preview_cache_dir(digest: str) -> Path:
+    return settings.MEDIA_ROOT / PREVIEW_CACHE_DIR / digest
+
+
+def _record_preview_digest(ppt_path: Path) -> str:
+    """计算 PPT 内容哈希，连同 (mtime_ns, 大小) 记到会话目录，返回哈希。
+
+    先 stat 再哈希：哈希期间文件被改写时记录的版本对不上，编辑器不会用错缓存。
+    """
+    st = ppt_path.stat()
+    digest = _file_sha256(ppt_path)
+    record = {"digest": digest, "mtime_ns": st.st_mtime_ns, "size": st.st_size}
+    (ppt_path.parent / PREVIEW_DIGEST_FILE).write_bytes(dumps_json(record))
+    return digest
+
+
+def _store_preview_cache(
+    cache_dir: Path, shapes_data: dict, images_dir: Optional[Path] = None
+) -> None:
+    """写入预览缓存；都先写临时文件/目录再 rename，其他进程不会读到半成品。"""
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    shapes_tmp = cache_dir / f".{PREVIEW_SHAPES_FILE}.{uuid.uuid4().hex}"
+    shapes_tmp.write_bytes(dumps_json(shapes_data))
+    os.replace(shapes_tmp, cache_dir / PREVIEW_SHAPES_FILE)
+
+    if images_dir is None:
+        return
+    tmp_dir = cache_dir / f".images.{uuid.uuid4().hex}"
+    try:
+        shutil.copytree(images_dir, tmp_dir, copy_function=shutil.copyfile)
+        os.rename(tmp_dir, cache_dir / "images")
+    except OSError:
+        # 其他请求已写入同一缓存，丢弃本次副本
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _prune_preview_cache() -> None:
+    """只保留最近使用的 PREVIEW_CACHE_MAX_ENTRIES 个缓存条目（按目录 mtime，命中时会刷新）。"""
+    root = settings.MEDIA_ROOT / PREVIEW_CACHE_DIR
+    now = time.time()
+    entries = []
+    try:
+        with os.scandir(root) as it:
+            for entry in it:
+                if not entry.is_dir(follow_symlinks=False):
+                    continue
+                mtime = entry.stat(follow_symlinks=False).st_mtime
+                if entry.name.startswith("."):
+                    if now - mtime > _PREVIEW_CACHE_TMP_MAX_AGE:
+                        shutil.rmtree(entry.path, ignore_errors=True)
+                    continue
+                entries.append((mtime, entry.path))
+    except OSError:
+        return
+    entries.sort(reverse=True)
+    for _, path in entries[PREVIEW_CACHE_MAX_ENTRIES:]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def load_preview_shapes(ppt_path: Path, mtime_ns: int, size: int) -> Optional[dict]:
+    """从预览缓存读取会话 PPT 的元素信息（"none" 过滤模式），没有缓存时返回 None。
+
+    按预览任务记下的哈希查找，只有 PPT 仍是当时的版本 (mtime_ns, 大小) 才使用，不读取 PPT 本身。
+    """
+    try:
+        record = json.loads((ppt_path.parent / PREVIEW_DIGEST_FILE).read_bytes())
+        if (record["mtime_ns"], record["size"]) != (mtime_ns, size):
+            return None
+        shapes_file = _preview_cache_dir(record["digest"]) / PREVIEW_SHAPES_FILE
+        return json.loads(shapes_file.read_bytes())
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def generate_template_preview(session_dir: Path, ppt_path: Path) -> None:
+    """为编辑会话生成预览图和标注图（优先 LibreOffice，失败时用 python-pptx）。
+
+    相同内容的 PPT 直接复用 preview_cache 中的图片，跳过转换和标注。
+    """
+    try:
+        images_dir = session_dir / "images"
+        cache_dir = _preview_cache_dir(_record_preview_digest(ppt_path))
+        cached_images = cache_dir / "images"
+        if cached_images.is_dir():
+            try:
+                # 复制而不是链接：编辑过程中会话内的标注图会被重写
+                shutil.copytree(
+                    cached_images,
+                    images_dir,
+                    copy_function=shutil.copyfile,
+                    dirs_exist_ok=True,
+                )
+                # 刷新 mtime，淘汰时按最近使用排序
+                os.utime(cache_dir)
+            except OSError:
+                # 条目恰好被淘汰，按未命中重新生成
+                pass
+            else:
+                _write_preview_status(session_dir, PREVIEW_READY)
+                return
+
+        # 提取元素信息（编辑已发布模板时不做语义过滤，由前端根据JSON配置设置隐藏）
+        shapes_data = extract_shapes_info(ppt_path, filter_mode="none")
+
+        # 获取幻灯片尺寸
+        slide_width = shapes_data.get("slide_width", 12192000)
+        slide_height = shapes_data.get("slide_height", 6858000)
+
+        # 将 PPT 转换为图片（按幻灯片宽度选择 DPI，只渲染编辑器需要的分辨率）
+        convert_ppt_to_images(ppt_path, images_dir, dpi=preview_dpi(slide_width))
+
+        # 为每个页面生成标注图片（各页互不依赖，并行标注）
+        jobs = []
+        for page_data in shapes_data["pages"]:
+            image_path = images_dir / f"page_{page_data['page_num']}.png"
+            if image_path.exists():
+                jobs.append((image_path, page_data["shapes"]))
+        annotate_screenshots(jobs, slide_width=slide_width, slide_height=slide_height)
+
+        # 元素信息总是缓存，供编辑器加载时复用；图片只缓存 LibreOffice 转换的高保真预览，
+        # python-pptx 后备渲染的简化图不缓存
+        high_fidelity = (session_dir / f"{ppt_path.stem}.pdf").exists()
+        _store_preview_cache(
+            cache_dir, shapes_data, images_dir if high_fidelity else None
+        )
+        _prune_preview_cache()
+    except Exception:
+        logger.exception("[Preview %s] 生成预览图失败", session_dir.name)
+        _write_preview_status(session_dir, PREVIEW_FAILED)
+    else:
+        _write_preview_status(session_dir, PREVIEW_READY)
+
+
+def enqueue_template_preview(session_dir: Path, ppt_path: Path):
+    """标记预览为生成中并提交到后台线程池，返回 Future。"""
+    _write_preview_status(session_dir, PREVIEW_PENDING)
+    return _PREVIEW_EXECUTOR.submit(generate_template_preview, session_dir, ppt_path)
+
+
+def enqueue_dir_removal(path: Path):
+    """在后台删除目录（目录不存在或删除失败时忽略），返回 Future。"""
+    return _CLEANUP_EXECUTOR.submit(shutil.rmtree, path, ignore_errors=True)
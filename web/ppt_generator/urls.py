@@ -96,6 +96,11 @@ urlpatterns = [
         views.template_wizard_page,
         name="template_wizard_page",
     ),
+    path(
+        "developer-tools/template-preview-status/<str:session_id>/",
+        views.template_preview_status,
+        name="template_preview_status",
+    ),
     path(
         "developer-tools/publish-template/",
         views.publish_template,
@@ -5,17 +5,24 @@ PPT Generator utilities
 from .ppt_parser import extract_shapes_info, update_shape_name, is_generic_name
 from .image_annotator import (
     annotate_screenshot,
+    annotate_screenshots,
     convert_pdf_to_images,
     convert_ppt_to_pdf,
     convert_ppt_to_images,
+    preview_dpi,
 )
+from .json_response import FastJsonResponse, dumps_json
 
 __all__ = [
     "extract_shapes_info",
     "update_shape_name",
     "is_generic_name",
     "annotate_screenshot",
+    "annotate_screenshots",
     "convert_pdf_to_images",
     "convert_ppt_to_pdf",
     "convert_ppt_to_images",
+    "preview_dpi",
+    "FastJsonResponse",
+    "dumps_json",
 ]
@@ -10,12 +10,41 @@ PPT 截图标注工具
 """
 
 import io
+import os
 import platform
+import queue
 import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple
 from PIL import Image, ImageDraw, ImageFont
 
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，只做进程内限流
+    fcntl = None
+
+# pdftoppm 输出文件名前缀（按页码排序后再重命名为 page_N.png）
+_PDF_PAGE_PREFIX = "_pdfpage"
+
+# 预览图目标宽度（像素）：编辑器中预览图的显示宽度一般不超过 1024px
+PREVIEW_TARGET_WIDTH = 1280
+_EMU_PER_INCH = 914400
+
+# 并行标注预览图的最大线程数
+_ANNOTATE_MAX_WORKERS = min(8, os.cpu_count() or 1)
+
+# soffice 用户配置槽位：每个槽位使用独立的 UserInstallation 目录，避免并发转换争用
+# 同一个配置目录的单实例锁；目录在进程生命周期内复用，只有首次转换需要初始化配置。
+# 槽位数同时也是 LibreOffice 的最大并发数，多进程部署时各进程通过文件锁共享这些槽位
+SOFFICE_POOL_SIZE = max(1, int(os.environ.get("S2S_SOFFICE_POOL_SIZE", "2")))
+_SOFFICE_PROFILE_ROOT = Path(tempfile.gettempdir()) / "s2s_soffice_profiles"
+_soffice_slots: "queue.Queue[int]" = queue.Queue()
+for _slot in range(SOFFICE_POOL_SIZE):
+    _soffice_slots.put(_slot)
+
 
 def get_soffice_path() -> Optional[str]:
     """获取 LibreOffice soffice 可执行文件路径（跨平台）"""
@@ -37,6 +66,38 @@ def get_soffice_path() -> Optional[str]:
         return "soffice"
 
 
+@contextmanager
+def _soffice_slot():
+    """占用一个 soffice 配置槽位，返回该槽位的 UserInstallation 目录。
+
+    进程内用队列排队；有 fcntl 时再对槽位加文件锁，避免多个 worker 进程同时使用同一配置目录。
+    """
+    slot = _soffice_slots.get()
+    try:
+        profile_dir = _SOFFICE_PROFILE_ROOT / f"profile_{slot}"
+        if fcntl is None:
+            yield profile_dir
+            return
+        _SOFFICE_PROFILE_ROOT.mkdir(parents=True, exist_ok=True)
+        # 关闭文件即释放锁，进程异常退出时锁也会被系统回收
+        with open(_SOFFICE_PROFILE_ROOT / f"profile_{slot}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield profile_dir
+    finally:
+        _soffice_slots.put(slot)
+
+
+def preview_dpi(slide_width: int, max_dpi: int = 150) -> int:
+    """按幻灯片宽度（EMU）选择渲染 DPI，使预览图宽约 PREVIEW_TARGET_WIDTH 像素（不超过 max_dpi）。
+
+    16:9（13.33 英寸宽）的幻灯片约 96 DPI，比固定 150 DPI 少一半以上的像素。
+    """
+    if slide_width <= 0:
+        return max_dpi
+    dpi = round(PREVIEW_TARGET_WIDTH * _EMU_PER_INCH / slide_width)
+    return max(1, min(max_dpi, dpi))
+
+
 def convert_ppt_to_pdf(pptx_path: Path, output_dir: Path) -> Optional[Path]:
     """
     使用 LibreOffice 将 PPT 转换为 PDF（跨平台）
@@ -55,21 +116,24 @@ def convert_ppt_to_pdf(pptx_path: Path, output_dir: Path) -> Optional[Path]:
     output_dir.mkdir(parents=True, exist_ok=True)
 
     try:
-        subprocess.run(
-            [
-                soffice,
-                "--headless",
-                "--convert-to",
-                "pdf",
-                "--outdir",
-                str(output_dir),
-                str(pptx_path),
-            ],
-            check=True,
-            capture_output=True,
-            text=True,
-            timeout=120,
-        )
+        # 取出一个空闲槽位，槽位全部占用时排队等待
+        with _soffice_slot() as profile_dir:
+            subprocess.run(
+                [
+                    soffice,
+                    f"-env:UserInstallation={profile_dir.as_uri()}",
+                    "--headless",
+                    "--convert-to",
+                    "pdf",
+                    "--outdir",
+                    str(output_dir),
+                    str(pptx_path),
+                ],
+                check=True,
+                capture_output=True,
+                text=True,
+                timeout=120,
+            )
 
         pdf_path = output_dir / (pptx_path.stem + ".pdf")
         if pdf_path.exists() and pdf_path.stat().st_size > 0:
@@ -96,12 +160,20 @@ def convert_pdf_to_images(
     from pdf2image import convert_from_path
 
     output_dir.mkdir(parents=True, exist_ok=True)
-    images = convert_from_path(pdf_path, dpi=dpi)
+    # 让 pdftoppm 直接把 PNG 写到输出目录，不再经 PIL 解码后重新编码保存
+    rendered = convert_from_path(
+        pdf_path,
+        dpi=dpi,
+        fmt="png",
+        output_folder=output_dir,
+        output_file=_PDF_PAGE_PREFIX,
+        paths_only=True,
+    )
 
     image_paths = []
-    for i, image in enumerate(images, start=1):
+    for i, rendered_path in enumerate(rendered, start=1):
         image_path = output_dir / f"page_{i}.png"
-        image.save(image_path, "PNG")
+        os.replace(rendered_path, image_path)
         image_paths.append(image_path)
 
     return image_paths
@@ -390,3 +462,33 @@ def annotate_screenshot(
     annotated_path = image_path.parent / f"{image_path.stem}_annotated.png"
     img.save(annotated_path)
     return annotated_path
+
+
+def annotate_screenshots(
+    jobs: List[Tuple[Path, List[Dict]]],
+    slide_width: int = 12192000,
+    slide_height: int = 6858000,
+) -> List[Path]:
+    """并行标注多页预览图，按输入顺序返回标注后的图片路径。
+
+    jobs 为 (image_path, shapes) 列表。各页互不依赖，PIL 解码/绘制/编码 PNG 时会释放 GIL，
+    因此用线程池即可并行；进程池需要为每个请求启动进程并 pickle 每页的元素列表，
+    在 Windows（spawn）下启动开销甚至超过标注本身。
+    """
+    if len(jobs) <= 1:
+        return [
+            annotate_screenshot(
+                image_path, shapes, slide_width=slide_width, slide_height=slide_height
+            )
+            for image_path, shapes in jobs
+        ]
+    workers = min(_ANNOTATE_MAX_WORKERS, len(jobs))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(
+            executor.map(
+                lambda job: annotate_screenshot(
+                    job[0], job[1], slide_width=slide_width, slide_height=slide_height
+                ),
+                jobs,
+            )
+        )
@@ -0,0 +1,45 @@
+"""
+JSON 序列化工具
+
+安装了 orjson 时用它序列化（C 实现，直接输出 bytes），否则退回标准库 json。
+"""
+
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson 是可选依赖
+    orjson = None
+
+_DJANGO_ENCODER = DjangoJSONEncoder()
+
+
+def dumps_json(data, indent: bool = False) -> bytes:
+    """把数据序列化为 UTF-8 JSON bytes（不转义中文）。
+
+    orjson 不支持的类型（Decimal、惰性翻译字符串等）交给 DjangoJSONEncoder 处理。
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=_DJANGO_ENCODER.default, option=option)
+    return json.dumps(
+        data, cls=DjangoJSONEncoder, ensure_ascii=False, indent=2 if indent else None
+    ).encode("utf-8")
+
+
+class FastJsonResponse(HttpResponse):
+    """与 JsonResponse 用法相同，但用 dumps_json 序列化。"""
+
+    def __init__(self, data, safe: bool = True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError(
+                "In order to allow non-dict objects to be serialized set the "
+                "safe parameter to False."
+            )
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(content=dumps_json(data), **kwargs)
@@ -9,7 +9,7 @@ PPT 模板解析工具
 
 import re
 from pathlib import Path
-from typing import Dict, List
+from typing import BinaryIO, Dict, List, Union
 from pptx import Presentation
 from pptx.enum.shapes import MSO_SHAPE_TYPE
 
@@ -195,12 +195,14 @@ def is_editable_content(shape, slide_width: int, slide_height: int) -> bool:
     return False
 
 
-def extract_shapes_info(pptx_path: Path, filter_mode: str = "semantic") -> Dict:
+def extract_shapes_info(
+    pptx_path: Union[Path, BinaryIO], filter_mode: str = "semantic"
+) -> Dict:
     """
     提取所有元素的坐标信息
 
     Args:
-        pptx_path: PPT 文件路径
+        pptx_path: PPT 文件路径，或已打开的二进制文件对象（如内存中的上传文件）
         filter_mode: 过滤模式
             - "semantic": 语义过滤，不符合条件的元素设置 is_hidden=True（上传新PPT用）
             - "none": 不过滤，返回所有可用元素（加载发布模板用，由前端根据JSON设置隐藏）
@@ -233,7 +235,9 @@ def extract_shapes_info(pptx_path: Path, filter_mode: str = "semantic") -> Dict:
             ]
         }
     """
-    prs = Presentation(str(pptx_path))
+    if not hasattr(pptx_path, "read"):
+        pptx_path = str(pptx_path)
+    prs = Presentation(pptx_path)
     pages = []
 
     # 获取幻灯片尺寸
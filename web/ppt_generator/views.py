@@ -2,66 +2,292 @@
 Views for PPT Generator application.
 """
 
+import os
+import re
 import sys
 import json
+import base64
+import copy
+import logging
+import mmap
+import mimetypes
+import shutil
+import tempfile
+import threading
+import time
 import traceback
 import uuid
+from urllib.parse import quote
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache, wraps
 from pathlib import Path
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse, FileResponse, Http404
-from django.views.decorators.http import require_http_methods
+from django.http import FileResponse, Http404, HttpResponse
+from django.views.decorators.http import condition, require_http_methods
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
 from django.conf import settings
-from django.core.files.base import ContentFile
+from django.core.files.move import file_move_safe
+from django.core.paginator import Paginator
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max, Q, TextField
+from django.db.models.functions import Cast
 from django.utils import timezone
+from django.utils.http import content_disposition_header
 
 from .models import GlobalLLMConfig, PPTGeneration, TemplateEditSession
 from .forms import PPTGenerationForm
+from .tasks import (
+    clear_template_json_cache,
+    enqueue_dir_removal,
+    enqueue_generation,
+    enqueue_template_preview,
+    load_preview_shapes,
+    read_preview_status,
+)
+from .utils import (
+    FastJsonResponse,
+    annotate_screenshot,
+    annotate_screenshots,
+    dumps_json,
+    convert_ppt_to_images,
+    extract_shapes_info,
+    update_shape_name,
+)
 
 # Add parent directory to path to import S2S modules
-sys.path.insert(0, str(settings.BASE_DIR.parent))
-from scripts.docx_to_config import generate_config_data
-from scripts.generate_slides import render_slides
+if str(settings.BASE_DIR.parent) not in sys.path:
+    sys.path.insert(0, str(settings.BASE_DIR.parent))
+from scripts.export_template_structure import (
+    ai_enrich_template,
+    export_template_structure,
+)
+from pptx import Presentation
 
+logger = logging.getLogger(__name__)
 
-def _guess_template_json(template_path: Path) -> Path:
-    """根据模板 PPT 路径自动推断对应的 template.json 配置文件路径。
 
-    优先级：
-    1. 与 PPT 同名的 JSON（同文件夹）：<folder>/<stem>.json
-    2. 同文件夹下的 template.json
-    3. 全局模板目录下的 template.json（兼容老行为）
+# 下载响应的分块大小（FileResponse 默认 4KB，大文件用 64KB 减少读写次数）
+_DOWNLOAD_BLOCK_SIZE = 1 << 16
+
+
+async def _aiter_file(path: Path, chunk_size: int):
+    """在线程池中分块读取文件，供 ASGI 下的下载响应异步迭代。"""
+    read_chunk = sync_to_async(lambda f: f.read(chunk_size), thread_sensitive=False)
+    f = await sync_to_async(open, thread_sensitive=False)(path, "rb")
+    try:
+        while chunk := await read_chunk(f):
+            yield chunk
+    finally:
+        await sync_to_async(f.close, thread_sensitive=False)()
+
+
+def _accel_redirect_uri(file_path: Path):
+    """按 S2S_ACCEL_REDIRECT_MAP 把本地文件路径映射为 nginx internal URI，未配置时返回 None。"""
+    for root, prefix in getattr(settings, "S2S_ACCEL_REDIRECT_MAP", {}).items():
+        try:
+            relative = Path(file_path).relative_to(root)
+        except ValueError:
+            continue
+        return prefix.rstrip("/") + "/" + quote(relative.as_posix())
+    return None
+
+
+def _download_response(request, file_path: Path, filename: str, content_type: str):
+    """构造文件下载响应。
+
+    配置了 S2S_ACCEL_REDIRECT_MAP 时只返回 X-Accel-Redirect 头，由 nginx 直接发送文件；
+    否则 WSGI 下直接交给 FileResponse，由 wsgi.file_wrapper（gunicorn 等会用 sendfile）按
+    _DOWNLOAD_BLOCK_SIZE 发送；ASGI 下 FileResponse 会把同步文件对象整个读入内存，
+    因此改为异步分块读取。
+    """
+    accel_uri = _accel_redirect_uri(file_path)
+    if accel_uri is not None:
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = accel_uri
+        response["Content-Disposition"] = content_disposition_header(True, filename)
+        return response
+
+    if not isinstance(request, ASGIRequest):
+        response = FileResponse(
+            open(file_path, "rb"),
+            as_attachment=True,
+            filename=filename,
+            content_type=content_type,
+        )
+        response.block_size = _DOWNLOAD_BLOCK_SIZE
+        return response
+
+    response = FileResponse(
+        _aiter_file(file_path, _DOWNLOAD_BLOCK_SIZE), content_type=content_type
+    )
+    response["Content-Length"] = str(os.stat(file_path).st_size)
+    response["Content-Disposition"] = content_disposition_header(True, filename)
+    return response
+
+
+def _scandir_recursive(path, max_depth: int):
+    """递归遍历目录，逐个产出文件的 DirEntry（跳过以 . 开头的隐藏文件和目录）。
+
+    max_depth 限制遍历层数（1 表示只看 path 本身）；跟随符号链接，
+    必须限制层数，避免链接成环时无限递归。
     """
-    base_dir = settings.S2S_TEMPLATE_DIR
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.name.startswith("."):
+                continue
+            # 跟随符号链接，链接进来的模板目录同样列出（与原先 iterdir()/is_dir() 一致）
+            if entry.is_dir():
+                if max_depth > 1:
+                    yield from _scandir_recursive(entry.path, max_depth - 1)
+            else:
+                yield entry
 
-    candidates = []
 
-    # 1) 同名 JSON：template1/template.pptx -> template1/template.json
-    candidates.append(template_path.with_suffix(".json"))
+# 上传文件落盘时的分块大小（Django 默认 64KB）
+_UPLOAD_CHUNK_SIZE = 1 << 20
+
+
+def _save_upload(uploaded_file, dest: Path) -> None:
+    """把上传文件保存到 dest。
+
+    已由 Django 落盘的临时上传文件直接移动过去（同一文件系统内仅是 rename），
+    内存中的小文件则按 1MB 分块写入。与 FileSystemStorage 一样按
+    FILE_UPLOAD_PERMISSIONS 设置权限（临时文件创建时是 0o600）。
+    """
+    if hasattr(uploaded_file, "temporary_file_path"):
+        file_move_safe(uploaded_file.temporary_file_path(), str(dest))
+    else:
+        with open(dest, "wb") as f:
+            for chunk in uploaded_file.chunks(chunk_size=_UPLOAD_CHUNK_SIZE):
+                f.write(chunk)
+    if settings.FILE_UPLOAD_PERMISSIONS is not None:
+        os.chmod(dest, settings.FILE_UPLOAD_PERMISSIONS)
+
+
+def _mtime_or_none(path: Path):
+    """返回文件的 mtime_ns，文件不存在时返回 None。"""
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _exception_response(exc: Exception, status: int = 500) -> FastJsonResponse:
+    """记录异常并返回 JSON 错误响应；仅在 DEBUG 模式下附带 traceback。"""
+    logger.exception("Request failed: %s", exc)
+    payload = {"error": str(exc)}
+    if settings.DEBUG:
+        payload["traceback"] = traceback.format_exc()
+    return FastJsonResponse(payload, status=status)
+
+
+def _json_endpoint(view):
+    """JSON 接口装饰器：未捕获的异常统一交给 _exception_response 处理。"""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except Exception as e:
+            return _exception_response(e)
+
+    return wrapper
+
+
+# 模板目录扫描结果缓存：目录 mtime 未变且未超过 TTL 时直接复用
+_TEMPLATE_CACHE_TTL = 30
+_TEMPLATE_CACHE = {"mtime": None, "time": 0.0, "templates": [], "configs": []}
+_TEMPLATE_CACHE_LOCK = threading.Lock()
+
+
+def _scan_template_dir(template_dir: Path):
+    """扫描模板目录，返回 (预设模板列表, 配置模板相对路径列表)。
+
+    预设模板按“根目录 template.pptx 在前，其余按子目录名排序”排列。
+    """
+    has_root_template = False
+    template_subdirs = []
+    available_config_templates = []
+
+    # 一次遍历同时收集 template.pptx 与 *.json，DirEntry 自带类型信息，无需逐个 stat。
+    # 模板目录约定只有两层（根目录 + 模板子目录），不再深入更深的导出/缓存目录
+    # entry.path 均以 "<template_dir>/" 开头，直接切片得到相对路径，无需 relpath 规范化
+    prefix_len = len(os.path.join(template_dir, ""))
+    for entry in _scandir_recursive(template_dir, max_depth=2):
+        name = entry.name
+        if name.endswith(".json"):
+            # 使用相对路径方便前端展示和回填
+            available_config_templates.append(entry.path[prefix_len:])
+        elif name == "template.pptx":
+            subdir = entry.path[prefix_len:].rpartition(os.sep)[0]
+            if subdir:
+                template_subdirs.append(subdir)
+            else:
+                has_root_template = True
+
+    # 1. Root template.pptx
+    available_templates = []
+    if has_root_template:
+        available_templates.append(
+            {"name": "默认模板 (template.pptx)", "path": "template.pptx"}
+        )
+    # 2. Subdirectories
+    for subdir in sorted(template_subdirs):
+        available_templates.append(
+            {"name": f"{subdir} (template.pptx)", "path": subdir + "/template.pptx"}
+        )
+
+    available_config_templates.sort()
+    return available_templates, available_config_templates
+
+
+def _get_template_listing():
+    """返回模板目录扫描结果（带缓存）。
+
+    子目录内的文件变化不会更新根目录 mtime，因此另加短 TTL 兜底；
+    发布模板等写入模板目录的操作应调用 _invalidate_template_listing()。
+    """
+    template_dir = settings.S2S_TEMPLATE_DIR
+    try:
+        mtime = os.stat(template_dir).st_mtime_ns
+    except FileNotFoundError:
+        return [], []
+
+    with _TEMPLATE_CACHE_LOCK:
+        if (
+            _TEMPLATE_CACHE["mtime"] == mtime
+            and time.monotonic() - _TEMPLATE_CACHE["time"] < _TEMPLATE_CACHE_TTL
+        ):
+            return list(_TEMPLATE_CACHE["templates"]), list(_TEMPLATE_CACHE["configs"])
 
-    # 2) 同目录下的 template.json
-    candidates.append(template_path.parent / "template.json")
+    templates, configs = _scan_template_dir(template_dir)
 
-    # 3) 全局默认 template.json
-    candidates.append(base_dir / "template.json")
+    with _TEMPLATE_CACHE_LOCK:
+        _TEMPLATE_CACHE.update(
+            mtime=mtime, time=time.monotonic(), templates=templates, configs=configs
+        )
+    return list(templates), list(configs)
 
-    for candidate in candidates:
-        if candidate.exists():
-            return candidate
 
-    # 如果都不存在，最后仍然返回全局默认路径，让后续报出清晰错误
-    return base_dir / "template.json"
+def _invalidate_template_listing():
+    """使模板目录扫描缓存及 template.json 推断缓存失效。"""
+    with _TEMPLATE_CACHE_LOCK:
+        _TEMPLATE_CACHE["mtime"] = None
+    clear_template_json_cache()
 
 
 @login_required
 def index(request):
     """Main page with upload form and history."""
     # Check if user is developer
-    is_developer = (
-        request.user.groups.filter(name="开发者").exists() or request.user.is_superuser
-    )
+    is_developer = request.is_developer
 
     if request.method == "POST":
         form = PPTGenerationForm(request.POST, request.FILES)
@@ -118,40 +344,15 @@ def index(request):
         form = PPTGenerationForm()
 
     # Get recent generations for current user
-    recent_generations = PPTGeneration.objects.filter(user=request.user).order_by(
-        "-created_at"
-    )[:10]
+    # 只取列表展示用到的字段，跳过 error_message、user_prompt 等大字段
+    recent_generations = (
+        PPTGeneration.objects.filter(user=request.user)
+        .only("id", "status", "course_name", "created_at")
+        .order_by("-created_at")[:10]
+    )
 
     # Get available templates from template directory
-    template_dir = settings.S2S_TEMPLATE_DIR
-    available_templates = []
-    available_config_templates = []
-    if template_dir.exists():
-        # Scan for template.pptx in subdirectories (e.g. template/template1/template.pptx)
-        # Also include template.pptx in root for backward compatibility
-
-        # 1. Root template.pptx
-        if (template_dir / "template.pptx").exists():
-            available_templates.append(
-                {"name": "默认模板 (template.pptx)", "path": "template.pptx"}
-            )
-
-        # 2. Subdirectories
-        for subdir in template_dir.iterdir():
-            if subdir.is_dir() and not subdir.name.startswith("."):
-                ppt_path = subdir / "template.pptx"
-                if ppt_path.exists():
-                    available_templates.append(
-                        {
-                            "name": f"{subdir.name} (template.pptx)",
-                            "path": str(subdir.name) + "/template.pptx",
-                        }
-                    )
-
-        for json_file in template_dir.rglob("*.json"):
-            # 使用相对路径方便前端展示和回填
-            rel_path = json_file.relative_to(template_dir)
-            available_config_templates.append(str(rel_path))
+    available_templates, available_config_templates = _get_template_listing()
 
     context = {
         "form": form,
@@ -169,9 +370,7 @@ def generation_detail(request, pk):
     generation = get_object_or_404(PPTGeneration, pk=pk)
 
     # Check if user is developer
-    is_developer = (
-        request.user.groups.filter(name="开发者").exists() or request.user.is_superuser
-    )
+    is_developer = request.is_developer
 
     # Check if preprocessed script exists
     has_preprocessed_script = False
@@ -188,197 +387,34 @@ def generation_detail(request, pk):
     return render(request, "ppt_generator/detail.html", context)
 
 
-def _run_generation_task(generation_id):
-    """Background task to run PPT generation."""
-    import os
-    from django.db import connection
-
-    # 关闭当前线程的数据库连接，让它创建新的连接
-    connection.close()
-
-    from .models import PPTGeneration, GlobalLLMConfig
-
-    try:
-        generation = PPTGeneration.objects.get(pk=generation_id)
-
-        # Determine template path
-        if generation.template_file:
-            template_path = Path(generation.template_file.path)
-        else:
-            template_path = settings.S2S_TEMPLATE_DIR / generation.template_name
-
-        if not template_path.exists():
-            raise FileNotFoundError(f"模板文件不存在: {template_path}")
-
-        # Prepare paths
-        docx_path = Path(generation.docx_file.path)
-
-        # Determine template.json config: uploaded file > dropdown selection > auto-guess
-        if generation.config_template_file:
-            template_json = Path(generation.config_template_file.path)
-        elif generation.config_template:
-            template_json = settings.S2S_TEMPLATE_DIR / generation.config_template
-        else:
-            template_json = _guess_template_json(template_path)
-
-        if not template_json.exists():
-            raise FileNotFoundError(f"配置模板不存在: {template_json}")
-
-        template_list = settings.S2S_TEMPLATE_DIR / "template.txt"
-
-        # Create run directory
-        run_dir = settings.S2S_TEMP_DIR / f"web-{generation.id}"
-        run_dir.mkdir(parents=True, exist_ok=True)
-
-        # Prepare metadata overrides
-        metadata_overrides = {
-            "course": generation.course_name,
-            "college": generation.college_name,
-            "lecturer": generation.lecturer_name,
-        }
-
-        # Prepare LLM configuration
-        if generation.use_llm:
-            if (
-                generation.llm_config_choice == "preset"
-                and generation.llm_preset_config
-            ):
-                preset = generation.llm_preset_config
-                llm_provider = preset.llm_provider
-                llm_model = preset.get_model_for_provider()
-                llm_api_key = preset.llm_api_key
-                llm_base_url = preset.llm_base_url
-                user_prompt = generation.user_prompt or preset.default_prompt
-            else:
-                llm_provider = generation.llm_provider
-                llm_model = generation.llm_model
-                llm_api_key = generation.llm_api_key
-                llm_base_url = generation.llm_base_url
-                user_prompt = generation.user_prompt
-
-                if not llm_provider or not llm_api_key:
-                    global_config = GlobalLLMConfig.get_config()
-                    llm_provider = llm_provider or global_config.llm_provider
-                    llm_model = llm_model or global_config.get_model_for_provider()
-                    llm_api_key = llm_api_key or global_config.llm_api_key
-                    llm_base_url = llm_base_url or global_config.llm_base_url
-                    user_prompt = user_prompt or global_config.default_prompt
-        else:
-            llm_provider = None
-            llm_model = None
-            llm_base_url = None
-            llm_api_key = None
-            user_prompt = None
-
-        # Set API key in environment
-        for key in [
-            "DEEPSEEK_API_KEY",
-            "TAICHU_API_KEY",
-            "GLM_API_KEY",
-            "LOCAL_LLM_API_KEY",
-        ]:
-            os.environ.pop(key, None)
-
-        if llm_api_key:
-            if llm_provider == "deepseek":
-                os.environ["DEEPSEEK_API_KEY"] = llm_api_key
-            elif llm_provider == "taichu":
-                os.environ["TAICHU_API_KEY"] = llm_api_key
-            elif llm_provider == "glm" or llm_provider == "zhipu":
-                os.environ["GLM_API_KEY"] = llm_api_key
-            elif llm_provider == "local":
-                os.environ["LOCAL_LLM_API_KEY"] = llm_api_key
-
-        # Step 1: Generate config JSON
-        config_data = generate_config_data(
-            docx_path=str(docx_path),
-            template_json=str(template_json),
-            template_list=str(template_list),
-            use_llm=generation.use_llm,
-            llm_provider=llm_provider,
-            llm_model=llm_model,
-            llm_base_url=llm_base_url,
-            metadata_overrides=metadata_overrides,
-            run_dir=run_dir,
-            user_prompt=user_prompt,
-        )
-
-        # Save config JSON
-        config_path = run_dir / "config.json"
-        config_path.write_text(
-            json.dumps(config_data, ensure_ascii=False, indent=2), encoding="utf-8"
-        )
-
-        # Step 2: Render slides
-        result = render_slides(
-            template_path=template_path,
-            config=config_data,
-            output_name="slides.pptx",
-            run_dir=run_dir,
-        )
-
-        output_path = result["output_path"]
-
-        # Save output files to model
-        with open(output_path, "rb") as f:
-            generation.output_ppt.save(
-                f"generation_{generation.id}.pptx", ContentFile(f.read()), save=False
-            )
-
-        with open(config_path, "rb") as f:
-            generation.config_json.save(
-                f"config_{generation.id}.json", ContentFile(f.read()), save=False
-            )
-
-        generation.mark_completed(
-            output_path=generation.output_ppt.name,
-            config_path=generation.config_json.name,
-            run_dir=run_dir,
-        )
-
-        print(f"[Generation {generation_id}] 完成")
-
-    except Exception as e:
-        error_msg = f"{str(e)}\n\n{traceback.format_exc()}"
-        try:
-            generation = PPTGeneration.objects.get(pk=generation_id)
-            generation.mark_failed(error_msg)
-        except Exception:
-            pass
-        print(f"[Generation {generation_id}] 失败: {e}")
-
-
 @login_required
 @require_http_methods(["POST"])
 def start_generation(request, pk):
     """Start PPT generation process (AJAX endpoint)."""
-    import threading
-
     generation = get_object_or_404(PPTGeneration, pk=pk)
 
     if generation.status != "pending":
-        return JsonResponse(
+        return FastJsonResponse(
             {"success": False, "error": "该任务已经开始处理或已完成"}, status=400
         )
 
     try:
         generation.mark_processing()
 
-        # 在后台线程中执行生成任务
-        thread = threading.Thread(target=_run_generation_task, args=(pk,))
-        thread.daemon = True
-        thread.start()
+        # 提交到后台线程池执行，请求立即返回，前端通过 check_status 轮询
+        enqueue_generation(pk)
 
-        return JsonResponse(
+        return FastJsonResponse(
             {
                 "success": True,
+                "status": "processing",
                 "message": "PPT生成任务已启动",
                 "generation_id": generation.id,
             }
         )
 
     except Exception as e:
-        return JsonResponse(
+        return FastJsonResponse(
             {
                 "success": False,
                 "error": str(e),
@@ -391,12 +427,16 @@ def start_generation(request, pk):
 @require_http_methods(["GET"])
 def check_status(request, pk):
     """Check generation status (AJAX endpoint)."""
-    generation = get_object_or_404(PPTGeneration, pk=pk)
+    # 前端会频繁轮询，只取返回状态需要的字段
+    generation = get_object_or_404(
+        PPTGeneration.objects.only(
+            "id", "status", "output_ppt", "config_json", "error_message"
+        ),
+        pk=pk,
+    )
 
     # Check if user is developer
-    is_developer = (
-        request.user.groups.filter(name="开发者").exists() or request.user.is_superuser
-    )
+    is_developer = request.is_developer
 
     response_data = {
         "status": generation.status,
@@ -411,7 +451,7 @@ def check_status(request, pk):
     elif generation.status == "failed":
         response_data["error"] = generation.error_message
 
-    return JsonResponse(response_data)
+    return FastJsonResponse(response_data)
 
 
 @login_required
@@ -430,14 +470,12 @@ def download_ppt(request, pk):
     if not file_path.exists():
         raise Http404("PPT文件不存在")
 
-    response = FileResponse(
-        open(file_path, "rb"),
-        content_type="application/vnd.openxmlformats-officedocument.presentationml.presentation",
-    )
-    response["Content-Disposition"] = (
-        f'attachment; filename="generated_{generation.id}.pptx"'
+    return _download_response(
+        request,
+        file_path,
+        f"generated_{generation.id}.pptx",
+        "application/vnd.openxmlformats-officedocument.presentationml.presentation",
     )
-    return response
 
 
 @login_required
@@ -446,11 +484,9 @@ def download_config_json(request, pk):
     """
     下载配置 JSON（仅管理员/开发者可用）
     """
-    is_developer = (
-        request.user.groups.filter(name="开发者").exists() or request.user.is_superuser
-    )
+    is_developer = request.is_developer
     if not is_developer:
-        return JsonResponse({"error": "权限不足"}, status=403)
+        return FastJsonResponse({"error": "权限不足"}, status=403)
 
     generation = get_object_or_404(PPTGeneration, pk=pk)
 
@@ -465,14 +501,9 @@ def download_config_json(request, pk):
     if not file_path.exists():
         raise Http404("配置文件不存在")
 
-    response = FileResponse(
-        open(file_path, "rb"),
-        content_type="application/json",
-    )
-    response["Content-Disposition"] = (
-        f'attachment; filename="config_{generation.id}.json"'
+    return _download_response(
+        request, file_path, f"config_{generation.id}.json", "application/json"
     )
-    return response
 
 
 @login_required
@@ -488,11 +519,9 @@ def download_preprocessed_script(request, pk):
         Markdown 文件下载响应
     """
     # 检查权限：仅管理员和开发者可以下载
-    is_developer = (
-        request.user.groups.filter(name="开发者").exists() or request.user.is_superuser
-    )
+    is_developer = request.is_developer
     if not is_developer:
-        return JsonResponse({"error": "权限不足，仅管理员/开发者可下载"}, status=403)
+        return FastJsonResponse({"error": "权限不足，仅管理员/开发者可下载"}, status=403)
 
     generation = get_object_or_404(PPTGeneration, pk=pk)
 
@@ -503,31 +532,40 @@ def download_preprocessed_script(request, pk):
     if not script_path.exists():
         raise Http404("预分页讲稿不存在（可能该生成使用了带标记的讲稿）")
 
-    response = FileResponse(
-        open(script_path, "rb"),
-        content_type="text/markdown; charset=utf-8",
-    )
-    response["Content-Disposition"] = (
-        f'attachment; filename="preprocessed_script_{generation.id}.md"'
+    return _download_response(
+        request,
+        script_path,
+        f"preprocessed_script_{generation.id}.md",
+        "text/markdown; charset=utf-8",
     )
-    return response
 
 
 @login_required
 def history(request):
     """View generation history (filtered by user)."""
     # Each user can only see their own generation history
-    generations = PPTGeneration.objects.filter(user=request.user).order_by(
-        "-created_at"
+    # 历史列表不访问 user/llm_preset_config 等关联，只取表格中展示的字段
+    generations = (
+        PPTGeneration.objects.filter(user=request.user)
+        .only(
+            "id",
+            "status",
+            "course_name",
+            "template_file",
+            "template_name",
+            "use_llm",
+            "created_at",
+        )
+        .order_by("-created_at")
     )
+    page_obj = Paginator(generations, 25).get_page(request.GET.get("page"))
 
     # Check if user is developer
-    is_developer = (
-        request.user.groups.filter(name="开发者").exists() or request.user.is_superuser
-    )
+    is_developer = request.is_developer
 
     context = {
-        "generations": generations,
+        "generations": page_obj,
+        "page_obj": page_obj,
         "is_developer": is_developer,
     }
     return render(request, "ppt_generator/history.html", context)
@@ -565,26 +603,24 @@ def user_logout(request):
 @permission_required("ppt_generator.can_export_template_json", raise_exception=True)
 def developer_tools(request):
     """Developer tools for managing LLM config templates."""
-    is_developer = (
-        request.user.groups.filter(name="开发者").exists() or request.user.is_superuser
-    )
+    is_developer = request.is_developer
 
-    # 获取已发布的模板列表
-    published_templates = []
+    # 获取已发布的模板列表（复用首页的模板目录扫描缓存）
     template_dir = settings.S2S_TEMPLATE_DIR
-    if template_dir.exists():
-        for item in sorted(template_dir.iterdir()):
-            if item.is_dir():
-                pptx_file = item / "template.pptx"
-                json_file = item / "template.json"
-                if pptx_file.exists():
-                    published_templates.append(
-                        {
-                            "name": item.name,
-                            "path": str(item),
-                            "has_json": json_file.exists(),
-                        }
-                    )
+    available_templates, available_config_templates = _get_template_listing()
+    config_templates = set(available_config_templates)
+    published_templates = []
+    for template in available_templates:
+        subdir, _, _ = template["path"].rpartition("/")
+        if not subdir:
+            continue
+        published_templates.append(
+            {
+                "name": subdir,
+                "path": str(template_dir / subdir),
+                "has_json": os.path.join(subdir, "template.json") in config_templates,
+            }
+        )
 
     context = {
         "is_developer": is_developer,
@@ -597,9 +633,7 @@ def developer_tools(request):
 @permission_required("ppt_generator.can_export_template_json", raise_exception=True)
 def config_generator_page(request):
     """Config generator independent page."""
-    is_developer = (
-        request.user.groups.filter(name="开发者").exists() or request.user.is_superuser
-    )
+    is_developer = request.is_developer
 
     context = {
         "is_developer": is_developer,
@@ -611,9 +645,7 @@ def config_generator_page(request):
 @permission_required("ppt_generator.can_export_template_json", raise_exception=True)
 def config_editor_page(request):
     """Config editor independent page."""
-    is_developer = (
-        request.user.groups.filter(name="开发者").exists() or request.user.is_superuser
-    )
+    is_developer = request.is_developer
 
     # 检查是否是嵌入模式
     embedded = request.GET.get("embedded") == "1"
@@ -640,9 +672,7 @@ def config_editor_page(request):
 @permission_required("ppt_generator.can_export_template_json", raise_exception=True)
 def template_editor_page(request):
     """Template editor independent page."""
-    is_developer = (
-        request.user.groups.filter(name="开发者").exists() or request.user.is_superuser
-    )
+    is_developer = request.is_developer
 
     # 检查是否是嵌入模式（从向导页面的 iframe 加载）
     embedded = request.GET.get("embedded") == "1"
@@ -662,6 +692,7 @@ def template_editor_page(request):
 
 @login_required
 @permission_required("ppt_generator.can_export_template_json", raise_exception=True)
+@_json_endpoint
 def generate_config_template(request):
     """Generate config template from PPTX (AJAX endpoint)."""
     if request.method == "POST":
@@ -669,97 +700,69 @@ def generate_config_template(request):
         mode = request.POST.get("mode", "semantic")
 
         if not template_file:
-            return JsonResponse({"error": "请上传模板文件"}, status=400)
-
-        try:
-            # Save template temporarily
-            import tempfile
-            import os
-            from pathlib import Path
+            return FastJsonResponse({"error": "请上传模板文件"}, status=400)
 
+        # Save template temporarily
+        # 大文件上传时 Django 已落盘为临时文件，直接分析即可，无需再复制一份
+        on_disk = hasattr(template_file, "temporary_file_path")
+        if on_disk:
+            tmp_path = template_file.temporary_file_path()
+        else:
             with tempfile.NamedTemporaryFile(delete=False, suffix=".pptx") as tmp:
-                for chunk in template_file.chunks():
+                for chunk in template_file.chunks(chunk_size=_UPLOAD_CHUNK_SIZE):
                     tmp.write(chunk)
                 tmp_path = tmp.name
 
-            # Import template analysis function
-            from scripts.export_template_structure import export_template_structure
-
-            # Analyze template
-            template_data = export_template_structure(
-                template_path=Path(tmp_path),
-                mode=mode,
-                include_pages=None,  # Export all pages
-            )
+        # Analyze template
+        template_data = export_template_structure(
+            template_path=Path(tmp_path),
+            mode=mode,
+            include_pages=None,  # Export all pages
+        )
 
-            # Clean up
+        # Clean up（Django 的上传临时文件在请求结束时自行清理）
+        if not on_disk:
             os.unlink(tmp_path)
 
-            return JsonResponse(template_data, safe=False)
-
-        except Exception as e:
-            import traceback
-
-            return JsonResponse(
-                {"error": str(e), "traceback": traceback.format_exc()}, status=500
-            )
+        return FastJsonResponse(template_data, safe=False)
 
-    return JsonResponse({"error": "仅支持 POST 请求"}, status=405)
+    return FastJsonResponse({"error": "仅支持 POST 请求"}, status=405)
 
 
 @login_required
 @permission_required("ppt_generator.can_export_template_json", raise_exception=True)
+@_json_endpoint
 def ai_enrich_template_view(request):
     """AI enrich template configuration (AJAX endpoint)."""
     if request.method == "POST":
-        try:
-            import json as json_module
-
-            # Get template data from request
-            template_data = json_module.loads(request.body)
-
-            # Get LLM configuration from global config
-            global_config = GlobalLLMConfig.get_config()
-            llm_provider = global_config.llm_provider
-            llm_model = global_config.llm_model
-            llm_base_url = global_config.llm_base_url
-            llm_api_key = global_config.llm_api_key
-
-            # Set API key in environment if provided
-            if llm_api_key:
-                import os
-
-                if llm_provider == "deepseek":
-                    os.environ["DEEPSEEK_API_KEY"] = llm_api_key
-                elif llm_provider == "local":
-                    os.environ["LOCAL_LLM_API_KEY"] = llm_api_key
-
-            # Import AI enrich function
-            from scripts.export_template_structure import ai_enrich_template
-
-            # Enrich template
-            enriched_data = ai_enrich_template(
-                template_data=template_data,
-                llm_provider=llm_provider,
-                llm_model=llm_model,
-                llm_base_url=llm_base_url,
-            )
-
-            return JsonResponse(enriched_data, safe=False)
-
-        except Exception as e:
-            import traceback
+        # Get template data from request
+        template_data = json.loads(request.body)
+
+        # Get LLM configuration from global config
+        global_config = GlobalLLMConfig.get_config()
+        llm_provider = global_config.llm_provider
+        llm_model = global_config.llm_model
+        llm_base_url = global_config.llm_base_url
+        llm_api_key = global_config.llm_api_key
+
+        # Enrich template
+        enriched_data = ai_enrich_template(
+            template_data=template_data,
+            llm_provider=llm_provider,
+            llm_model=llm_model,
+            llm_base_url=llm_base_url,
+            llm_api_key=llm_api_key or None,
+        )
 
-            return JsonResponse(
-                {"error": str(e), "traceback": traceback.format_exc()}, status=500
-            )
+        return FastJsonResponse(enriched_data, safe=False)
 
-    return JsonResponse({"error": "仅支持 POST 请求"}, status=405)
+    return FastJsonResponse({"error": "仅支持 POST 请求"}, status=405)
 
 
 @login_required
 @permission_required("ppt_generator.is_developer", raise_exception=True)
 @require_http_methods(["POST"])
+@_json_endpoint
 def parse_ppt_template(request):
     """
     解析 PPT 模板，提取元素信息并生成标注截图
@@ -779,108 +782,104 @@ def parse_ppt_template(request):
             ]
         }
     """
-    try:
-        import uuid
-        from .utils import (
-            extract_shapes_info,
-            convert_ppt_to_images,
-            annotate_screenshot,
+    # 获取上传的文件
+    ppt_file = request.FILES.get("ppt_file")
+
+    if not ppt_file:
+        return FastJsonResponse({"error": "请上传 PPT 文件"}, status=400)
+
+    # 创建临时目录
+    template_id = str(uuid.uuid4())
+    temp_dir = settings.MEDIA_ROOT / "template_editor" / template_id
+    temp_dir.mkdir(parents=True, exist_ok=True)
+
+    # 保存 PPT 文件（统一命名为 template.pptx，便于后续发布）
+    ppt_path = temp_dir / "template.pptx"
+    _save_upload(ppt_file, ppt_path)
+
+    # 小文件仍在内存中，直接解析上传对象，不必从磁盘再读一遍
+    shapes_source = ppt_path
+    if not hasattr(ppt_file, "temporary_file_path"):
+        ppt_file.seek(0)
+        shapes_source = ppt_file
+
+    # 将 PPT 转换为图片（优先 LibreOffice，失败时用 python-pptx）耗时最长，
+    # 放到后台线程执行，同时在当前线程提取元素信息
+    images_dir = temp_dir / "images"
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        images_future = executor.submit(
+            convert_ppt_to_images, ppt_path, images_dir, dpi=150
         )
+        shapes_data = extract_shapes_info(shapes_source)
+        image_paths = images_future.result()
+
+    # 获取幻灯片尺寸
+    slide_width = shapes_data.get("slide_width", 12192000)
+    slide_height = shapes_data.get("slide_height", 6858000)
+
+    # 为每个页面生成标注图片
+    annotated_pages = [
+        page_data
+        for page_data in shapes_data["pages"]
+        if page_data["page_num"] <= len(image_paths)
+    ]
+    annotated_paths = annotate_screenshots(
+        [
+            (image_paths[page_data["page_num"] - 1], page_data["shapes"])
+            for page_data in annotated_pages
+        ],
+        slide_width,
+        slide_height,
+    )
 
-        # 获取上传的文件
-        ppt_file = request.FILES.get("ppt_file")
-
-        if not ppt_file:
-            return JsonResponse({"error": "请上传 PPT 文件"}, status=400)
-
-        # 创建临时目录
-        template_id = str(uuid.uuid4())
-        temp_dir = settings.MEDIA_ROOT / "template_editor" / template_id
-        temp_dir.mkdir(parents=True, exist_ok=True)
-
-        # 保存 PPT 文件（统一命名为 template.pptx，便于后续发布）
-        ppt_path = temp_dir / "template.pptx"
-        with open(ppt_path, "wb+") as f:
-            for chunk in ppt_file.chunks():
-                f.write(chunk)
-
-        # 提取元素信息
-        shapes_data = extract_shapes_info(ppt_path)
-
-        # 将 PPT 转换为图片（优先 LibreOffice，失败时用 python-pptx）
-        images_dir = temp_dir / "images"
-        image_paths = convert_ppt_to_images(ppt_path, images_dir, dpi=150)
-
-        # 获取幻灯片尺寸
-        slide_width = shapes_data.get("slide_width", 12192000)
-        slide_height = shapes_data.get("slide_height", 6858000)
-
-        # 为每个页面生成标注图片
-        pages = []
-        for page_data in shapes_data["pages"]:
-            page_num = page_data["page_num"]
-
-            if page_num <= len(image_paths):
-                image_path = image_paths[page_num - 1]
+    pages = []
+    for page_data, annotated_path in zip(annotated_pages, annotated_paths):
+        page_num = page_data["page_num"]
 
-                # 生成标注图片（使用幻灯片尺寸计算坐标）
-                annotated_path = annotate_screenshot(
-                    image_path,
-                    page_data["shapes"],
-                    slide_width=slide_width,
-                    slide_height=slide_height,
-                )
-
-                # 生成相对 URL
-                relative_path = annotated_path.relative_to(settings.MEDIA_ROOT)
-                image_url = f"/media/{relative_path}"
-
-                # 根据元素类型推断页面类型
-                shapes = page_data["shapes"]
-                text_count = sum(1 for s in shapes if s.get("type") == "text")
-                image_count = sum(1 for s in shapes if s.get("type") == "image")
-
-                if text_count == 0 and image_count > 0:
-                    page_type = "纯图页"
-                elif text_count <= 3 and image_count == 0:
-                    page_type = "标题页"
-                elif image_count > 0:
-                    page_type = "图文页"
-                elif text_count > 0:
-                    page_type = "文字页"
-                else:
-                    page_type = f"第{page_num}页"
+        # 生成相对 URL
+        relative_path = annotated_path.relative_to(settings.MEDIA_ROOT)
+        image_url = f"/media/{relative_path}"
 
-                pages.append(
-                    {
-                        "page_num": page_num,
-                        "page_type": page_type,
-                        "image_url": image_url,
-                        "shapes": page_data["shapes"],
-                    }
-                )
+        # 根据元素类型推断页面类型
+        shapes = page_data["shapes"]
+        text_count = sum(1 for s in shapes if s.get("type") == "text")
+        image_count = sum(1 for s in shapes if s.get("type") == "image")
+
+        if text_count == 0 and image_count > 0:
+            page_type = "纯图页"
+        elif text_count <= 3 and image_count == 0:
+            page_type = "标题页"
+        elif image_count > 0:
+            page_type = "图文页"
+        elif text_count > 0:
+            page_type = "文字页"
+        else:
+            page_type = f"第{page_num}页"
 
-        return JsonResponse(
+        pages.append(
             {
-                "template_id": template_id,
-                "ppt_path": str(ppt_path.relative_to(settings.MEDIA_ROOT)),
-                "slide_width": shapes_data.get("slide_width", 12192000),
-                "slide_height": shapes_data.get("slide_height", 6858000),
-                "pages": pages,
+                "page_num": page_num,
+                "page_type": page_type,
+                "image_url": image_url,
+                "shapes": page_data["shapes"],
             }
         )
 
-    except Exception as e:
-        import traceback
-
-        return JsonResponse(
-            {"error": str(e), "traceback": traceback.format_exc()}, status=500
-        )
+    return FastJsonResponse(
+        {
+            "template_id": template_id,
+            "ppt_path": str(ppt_path.relative_to(settings.MEDIA_ROOT)),
+            "slide_width": shapes_data.get("slide_width", 12192000),
+            "slide_height": shapes_data.get("slide_height", 6858000),
+            "pages": pages,
+        }
+    )
 
 
 @login_required
 @permission_required("ppt_generator.is_developer", raise_exception=True)
 @require_http_methods(["POST"])
+@_json_endpoint
 def update_shape_name_api(request):
     """
     更新元素名称
@@ -896,42 +895,160 @@ def update_shape_name_api(request):
     Response:
         {"success": true}
     """
+    data = json.loads(request.body)
+    template_id = data.get("template_id")
+    page_num = data.get("page_num")
+    # 使用 shape_id 定位元素（支持 GROUP 内的元素）
+    shape_id = data.get("shape_id")
+    new_name = data.get("new_name")
+
+    if not all([template_id, page_num is not None, shape_id is not None, new_name]):
+        return FastJsonResponse({"error": "缺少必要参数"}, status=400)
+
+    # 获取 PPT 文件路径
+    ppt_file = _resolve_pptx(template_id)
+
+    if ppt_file is None:
+        return FastJsonResponse({"error": "找不到 PPT 文件"}, status=404)
+
+    # 更新元素名称（使用 shape_id 支持 GROUP 内元素）
+    logger.info(
+        "[update_shape_name] 更新形状名称: 文件=%s, 页码=%s, shape_id=%s, 新名称=%s",
+        ppt_file,
+        page_num,
+        shape_id,
+        new_name,
+    )
+    update_shape_name(ppt_file, page_num, shape_id, new_name)
+    logger.info("[update_shape_name] 保存成功")
+
+    return FastJsonResponse({"success": True})
+
+
+# 编辑器模板 ID -> PPT 路径，避免每次交互都扫描目录。
+# 会话 ID 不断新增，按最近使用顺序只保留 _PPTX_CACHE_MAX_ENTRIES 条
+_PPTX_CACHE: "OrderedDict[str, Path]" = OrderedDict()
+_PPTX_CACHE_MAX_ENTRIES = 256
+_PPTX_CACHE_LOCK = threading.Lock()
+
+
+def _resolve_pptx(template_id: str):
+    """返回编辑器模板目录中的 PPT 路径，找不到时返回 None。
+
+    解析结果缓存在进程内；缓存的文件不存在时重新扫描目录。
+    """
+    with _PPTX_CACHE_LOCK:
+        ppt_file = _PPTX_CACHE.get(template_id)
+        if ppt_file is not None:
+            _PPTX_CACHE.move_to_end(template_id)
+    if ppt_file is not None and ppt_file.exists():
+        return ppt_file
+
+    ppt_file = _first_pptx(settings.MEDIA_ROOT / "template_editor" / template_id)
+    with _PPTX_CACHE_LOCK:
+        if ppt_file is None:
+            _PPTX_CACHE.pop(template_id, None)
+        else:
+            _PPTX_CACHE[template_id] = ppt_file
+            _PPTX_CACHE.move_to_end(template_id)
+            while len(_PPTX_CACHE) > _PPTX_CACHE_MAX_ENTRIES:
+                _PPTX_CACHE.popitem(last=False)
+    return ppt_file
+
+
+def _forget_pptx(template_id: str) -> None:
+    """会话目录删除后移除对应的 PPT 路径缓存。"""
+    with _PPTX_CACHE_LOCK:
+        _PPTX_CACHE.pop(template_id, None)
+
+
+def _first_pptx(dir_path: Path):
+    """返回目录中第一个 .pptx 文件路径，找不到（或目录不存在）时返回 None。
+
+    用 scandir 找到即返回，不像 glob 那样枚举整个目录并为每项构造 Path。
+    """
     try:
-        import json
-        from .utils import update_shape_name
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                if entry.name.endswith(".pptx") and entry.is_file():
+                    return Path(entry.path)
+    except FileNotFoundError:
+        pass
+    return None
 
-        data = json.loads(request.body)
-        template_id = data.get("template_id")
-        page_num = data.get("page_num")
-        # 使用 shape_id 定位元素（支持 GROUP 内的元素）
-        shape_id = data.get("shape_id")
-        new_name = data.get("new_name")
 
-        if not all([template_id, page_num is not None, shape_id is not None, new_name]):
-            return JsonResponse({"error": "缺少必要参数"}, status=400)
+def _file_key(path: Path):
+    """(路径, mtime_ns, 大小)：文件被改写（如更新元素名称）后自然换键。"""
+    st = path.stat()
+    return str(path), st.st_mtime_ns, st.st_size
 
-        # 获取 PPT 文件路径
-        ppt_path = settings.MEDIA_ROOT / "template_editor" / template_id
-        ppt_files = list(ppt_path.glob("*.pptx"))
 
-        if not ppt_files:
-            return JsonResponse({"error": "找不到 PPT 文件"}, status=404)
+@lru_cache(maxsize=32)
+def _cached_shapes_info(path_str: str, mtime_ns: int, size: int, filter_mode: str):
+    if filter_mode == "none":
+        # 向导编辑已发布模板时，后台预览任务已为相同内容的 PPT 缓存了解析结果
+        cached = load_preview_shapes(Path(path_str), mtime_ns, size)
+        if cached is not None:
+            return cached
+    return extract_shapes_info(Path(path_str), filter_mode=filter_mode)
 
-        # 更新元素名称（使用 shape_id 支持 GROUP 内元素）
-        print(
-            f"[update_shape_name] 更新形状名称: 文件={ppt_files[0]}, 页码={page_num}, shape_id={shape_id}, 新名称={new_name}"
-        )
-        update_shape_name(ppt_files[0], page_num, shape_id, new_name)
-        print(f"[update_shape_name] 保存成功")
 
-        return JsonResponse({"success": True})
+def _shapes_info(ppt_file: Path, filter_mode: str = "semantic") -> dict:
+    """带缓存的 extract_shapes_info，返回副本，调用方可以随意修改。
 
-    except Exception as e:
-        import traceback
+    同一编辑会话里生成配置、恢复会话会反复解析同一个 PPT，
+    解压 + XML 解析是这些请求的主要耗时。
+    """
+    return copy.deepcopy(_cached_shapes_info(*_file_key(ppt_file), filter_mode))
+
+
+@lru_cache(maxsize=32)
+def _cached_slide_size(path_str: str, mtime_ns: int, size: int):
+    prs = Presentation(path_str)
+    return prs.slide_width, prs.slide_height
+
+
+def _slide_size(ppt_file: Path):
+    """带缓存的幻灯片尺寸（EMU），返回 (width, height)。"""
+    return _cached_slide_size(*_file_key(ppt_file))
+
+
+# AI 返回中的 JSON：优先取代码块（```json ... ```）里的内容，否则取第一个 { / [ 到最后一个 } / ]
+_FENCED_JSON_RE = re.compile(r"```(?:json)?\s*(\{.*?\}|\[.*?\])\s*```", re.DOTALL)
+_BARE_JSON_RE = re.compile(r"\{.*\}|\[.*\]", re.DOTALL)
 
-        return JsonResponse(
-            {"error": str(e), "traceback": traceback.format_exc()}, status=500
-        )
+
+def _extract_json_text(response: str) -> str:
+    """从 LLM 回复中提取 JSON 文本，找不到时返回去掉首尾空白的原文。"""
+    match = _FENCED_JSON_RE.search(response)
+    if match:
+        return match.group(1)
+    match = _BARE_JSON_RE.search(response)
+    if match:
+        return match.group(0)
+    return response.strip()
+
+
+@lru_cache(maxsize=8)
+def _image_data_url(path_str: str, mtime_ns: int, size: int) -> str:
+    """把图片编码为 data URL，按文件版本缓存（重试 AI 命名时会重复发送同一张图）。
+
+    通过 mmap 直接对文件内容做 base64，不再先把整个文件读成一份 bytes。
+    """
+    mime_type, _ = mimetypes.guess_type(path_str)
+    if not mime_type:
+        mime_type = "image/png"
+    with open(path_str, "rb") as f:
+        if size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                base64_image = base64.b64encode(mm).decode("ascii")
+        else:
+            base64_image = ""
+    return f"data:{mime_type};base64,{base64_image}"
+
+
+# 每个字符约占 40x40 pt，折算成 EMU²（1 pt = 914400 / 72 EMU）
+_EMU_PER_CHAR_AREA = (914400 / 72) ** 2 * 1600
 
 
 def _estimate_max_chars(shape: dict) -> int:
@@ -956,25 +1073,44 @@ def _estimate_max_chars(shape: dict) -> int:
 
     # 没有现有内容时，根据面积粗略估算
     # 假设平均每个中文字符占约 40x40 pt 的区域（更保守的估算）
-    EMU_PER_POINT = 914400 / 72
     width = shape.get("width", 0)
     height = shape.get("height", 0)
 
     if width and height:
-        width_pt = width / EMU_PER_POINT
-        height_pt = height / EMU_PER_POINT
         # 假设字符占用面积约 1600 平方点（40x40）- 更保守
-        area = width_pt * height_pt
-        estimated = int(area / 1600)
-        # 限制最大值为 150（PPT 文字不宜过长）
-        return min(max(estimated, 10), 150)
+        estimated = int(width * height / _EMU_PER_CHAR_AREA)
+        # 限制在 10~150 之间（PPT 文字不宜过长）
+        return 10 if estimated < 10 else 150 if estimated > 150 else estimated
 
     return 20  # 默认值
 
 
+def _text_slot(shape: dict) -> dict:
+    """文本元素的配置项（智能估算 max_chars）。"""
+    return {
+        "type": "text",
+        "hint": f"填写{shape['name']}的内容",
+        "required": True,
+        "value": "",
+        "max_chars": _estimate_max_chars(shape),
+    }
+
+
+def _image_slot() -> dict:
+    """图片元素的配置项。"""
+    return {
+        "type": "image",
+        "hint": "插入与本页主题相关的图片路径",
+        "required": True,
+        "value": "",
+        "preferred_format": "png/jpg",
+    }
+
+
 @login_required
 @permission_required("ppt_generator.is_developer", raise_exception=True)
 @require_http_methods(["POST"])
+@_json_endpoint
 def generate_template_config(request):
     """
     生成配置 JSON（符合 S2S 标准格式）
@@ -992,116 +1128,122 @@ def generate_template_config(request):
             }
         }
     """
-    try:
-        import json
-        from .utils import extract_shapes_info
+    data = json.loads(request.body)
+    template_id = data.get("template_id")
 
-        data = json.loads(request.body)
-        template_id = data.get("template_id")
+    if not template_id:
+        return FastJsonResponse({"error": "缺少 template_id"}, status=400)
 
-        if not template_id:
-            return JsonResponse({"error": "缺少 template_id"}, status=400)
-
-        # 获取 PPT 文件路径
-        ppt_path = settings.MEDIA_ROOT / "template_editor" / template_id
-        ppt_files = list(ppt_path.glob("*.pptx"))
-
-        if not ppt_files:
-            return JsonResponse({"error": "找不到 PPT 文件"}, status=404)
-
-        # 提取元素信息
-        shapes_data = extract_shapes_info(ppt_files[0])
-
-        # 生成符合 S2S 标准的配置 JSON
-        manifest = []
-        ppt_pages = []
-
-        for page_data in shapes_data["pages"]:
-            page_num = page_data["page_num"]
-            text_slots = 0
-            image_slots = 0
-            content = {}
-
-            for shape in page_data["shapes"]:
-                # 只包含已命名的元素（非隐藏）
-                if shape.get("is_named") and not shape.get("is_hidden"):
-                    name = shape["name"]
-                    is_text = shape["type"] == "text"
-
-                    if is_text:
-                        text_slots += 1
-                        # 智能估算 max_chars
-                        max_chars = _estimate_max_chars(shape)
-                        content[name] = {
-                            "type": "text",
-                            "hint": f"填写{name}的内容",
-                            "required": True,
-                            "value": "",
-                            "max_chars": max_chars,
-                        }
-                    else:
-                        image_slots += 1
-                        content[name] = {
-                            "type": "image",
-                            "hint": "插入与本页主题相关的图片路径",
-                            "required": True,
-                            "value": "",
-                            "preferred_format": "png/jpg",
-                        }
+    # 获取 PPT 文件路径
+    ppt_file = _resolve_pptx(template_id)
 
-            # 只添加有内容的页面
-            if content:
-                # 根据内容推断页面类型
-                page_type = f"第{page_num}页"
-                if text_slots == 0 and image_slots > 0:
-                    page_type = "纯图页"
-                elif text_slots <= 3 and image_slots == 0:
-                    page_type = "标题页"
-                elif image_slots > 0:
-                    page_type = "图文页"
-                else:
-                    page_type = "文字页"
+    if ppt_file is None:
+        return FastJsonResponse({"error": "找不到 PPT 文件"}, status=404)
 
-                manifest.append(
-                    {
-                        "template_page_num": page_num,
-                        "page_type": page_type,
+    # 提取元素信息
+    shapes_data = _shapes_info(ppt_file)
+
+    # 生成符合 S2S 标准的配置 JSON
+    manifest = []
+    ppt_pages = []
+
+    for page_data in shapes_data["pages"]:
+        page_num = page_data["page_num"]
+        # 只包含已命名的元素（非隐藏），先筛选一遍，槽位数直接由列表长度得到
+        named_shapes = [
+            shape
+            for shape in page_data["shapes"]
+            if shape.get("is_named") and not shape.get("is_hidden")
+        ]
+        text_slots = sum(1 for shape in named_shapes if shape["type"] == "text")
+        image_slots = len(named_shapes) - text_slots
+        # 保持元素原有顺序（文本和图片交错）
+        content = {
+            shape["name"]: (
+                _text_slot(shape) if shape["type"] == "text" else _image_slot()
+            )
+            for shape in named_shapes
+        }
+
+        # 只添加有内容的页面
+        if content:
+            # 根据内容推断页面类型
+            page_type = f"第{page_num}页"
+            if text_slots == 0 and image_slots > 0:
+                page_type = "纯图页"
+            elif text_slots <= 3 and image_slots == 0:
+                page_type = "标题页"
+            elif image_slots > 0:
+                page_type = "图文页"
+            else:
+                page_type = "文字页"
+
+            manifest.append(
+                {
+                    "template_page_num": page_num,
+                    "page_type": page_type,
+                    "text_slots": text_slots,
+                    "image_slots": image_slots,
+                }
+            )
+
+            ppt_pages.append(
+                {
+                    "page_type": page_type,
+                    "template_page_num": page_num,
+                    "content": content,
+                    "meta": {
+                        "layout": page_type,
+                        "scene": [],
+                        "style": "",
                         "text_slots": text_slots,
                         "image_slots": image_slots,
-                    }
-                )
+                        "notes": "请根据实际需要填写内容",
+                    },
+                }
+            )
 
-                ppt_pages.append(
-                    {
-                        "page_type": page_type,
-                        "template_page_num": page_num,
-                        "content": content,
-                        "meta": {
-                            "layout": page_type,
-                            "scene": [],
-                            "style": "",
-                            "text_slots": text_slots,
-                            "image_slots": image_slots,
-                            "notes": "请根据实际需要填写内容",
-                        },
-                    }
-                )
+    config = {"manifest": manifest, "ppt_pages": ppt_pages}
 
-        config = {"manifest": manifest, "ppt_pages": ppt_pages}
+    return FastJsonResponse({"config": config})
 
-        return JsonResponse({"config": config})
 
-    except Exception as e:
-        import traceback
+def _template_ppt_stat(request, template_id: str):
+    """返回编辑器模板的 (PPT 路径, stat 结果)，文件不存在时返回 (None, None)。
 
-        return JsonResponse(
-            {"error": str(e), "traceback": traceback.format_exc()}, status=500
-        )
+    结果记在 request 上，ETag、Last-Modified 和视图本身共用一次解析和 stat。
+    """
+    cached = getattr(request, "_template_ppt_stat", None)
+    if cached is not None:
+        return cached
+    ppt_file = _resolve_pptx(template_id)
+    st = None
+    if ppt_file is not None:
+        try:
+            st = ppt_file.stat()
+        except FileNotFoundError:
+            ppt_file = None
+    request._template_ppt_stat = (ppt_file, st)
+    return ppt_file, st
+
+
+def _template_ppt_etag(request, template_id):
+    _, st = _template_ppt_stat(request, template_id)
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}"' if st else None
+
+
+def _template_ppt_last_modified(request, template_id):
+    _, st = _template_ppt_stat(request, template_id)
+    return datetime.fromtimestamp(st.st_mtime, tz=dt_timezone.utc) if st else None
 
 
 @login_required
 @permission_required("ppt_generator.is_developer", raise_exception=True)
 @require_http_methods(["GET"])
+@condition(
+    etag_func=_template_ppt_etag, last_modified_func=_template_ppt_last_modified
+)
+@_json_endpoint
 def download_template_ppt(request, template_id):
     """
     下载编辑后的 PPT 模板
@@ -1112,36 +1254,28 @@ def download_template_ppt(request, template_id):
     Response:
         PPT 文件下载
     """
-    try:
-        from django.http import FileResponse
-
-        # 获取 PPT 文件路径
-        ppt_path = settings.MEDIA_ROOT / "template_editor" / template_id
-        ppt_files = list(ppt_path.glob("*.pptx"))
-
-        if not ppt_files:
-            return JsonResponse({"error": "找不到 PPT 文件"}, status=404)
-
-        # 返回文件下载
-        response = FileResponse(
-            open(ppt_files[0], "rb"),
-            content_type="application/vnd.openxmlformats-officedocument.presentationml.presentation",
-        )
-        response["Content-Disposition"] = f'attachment; filename="{ppt_files[0].name}"'
-
-        return response
-
-    except Exception as e:
-        import traceback
-
-        return JsonResponse(
-            {"error": str(e), "traceback": traceback.format_exc()}, status=500
-        )
+    # 获取 PPT 文件路径（condition 装饰器计算 ETag 时已解析过）
+    ppt_file, _ = _template_ppt_stat(request, template_id)
+
+    if ppt_file is None:
+        return FastJsonResponse({"error": "找不到 PPT 文件"}, status=404)
+
+    # 返回文件下载（ETag/Last-Modified 由 condition 装饰器设置，文件未变时直接返回 304）
+    response = _download_response(
+        request,
+        ppt_file,
+        ppt_file.name,
+        "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    )
+    # 编辑器里随时可能改名保存，浏览器每次都需重新验证
+    response["Cache-Control"] = "private, no-cache"
+    return response
 
 
 @login_required
 @permission_required("ppt_generator.is_developer", raise_exception=True)
 @require_http_methods(["POST"])
+@_json_endpoint
 def toggle_shape_visibility(request):
     """
     切换元素的隐藏/显示状态
@@ -1159,41 +1293,32 @@ def toggle_shape_visibility(request):
 
     Note: 这个功能只是在前端标记，不修改 PPT 文件
     """
-    try:
-        import json
-
-        data = json.loads(request.body)
-        template_id = data.get("template_id")
-        page_num = data.get("page_num")
-        shape_id = data.get("shape_id")
-        is_hidden = data.get("is_hidden")
-
-        if not all(
-            [
-                template_id,
-                page_num is not None,
-                shape_id is not None,
-                is_hidden is not None,
-            ]
-        ):
-            return JsonResponse({"error": "缺少必要参数"}, status=400)
-
-        # 这个功能只在前端维护状态，不需要修改 PPT 文件
-        # 前端会在生成配置 JSON 时自动过滤隐藏的元素
-
-        return JsonResponse({"success": True})
+    data = json.loads(request.body)
+    template_id = data.get("template_id")
+    page_num = data.get("page_num")
+    shape_id = data.get("shape_id")
+    is_hidden = data.get("is_hidden")
+
+    if not all(
+        [
+            template_id,
+            page_num is not None,
+            shape_id is not None,
+            is_hidden is not None,
+        ]
+    ):
+        return FastJsonResponse({"error": "缺少必要参数"}, status=400)
 
-    except Exception as e:
-        import traceback
+    # 这个功能只在前端维护状态，不需要修改 PPT 文件
+    # 前端会在生成配置 JSON 时自动过滤隐藏的元素
 
-        return JsonResponse(
-            {"error": str(e), "traceback": traceback.format_exc()}, status=500
-        )
+    return FastJsonResponse({"success": True})
 
 
 @login_required
 @permission_required("ppt_generator.is_developer", raise_exception=True)
 @require_http_methods(["POST"])
+@_json_endpoint
 def refresh_page_preview(request):
     """
     刷新页面预览图（用于隐藏/显示元素后更新标注）
@@ -1202,83 +1327,78 @@ def refresh_page_preview(request):
         {
             "template_id": "uuid",
             "page_num": 1,
-            "shapes": [...]  // 包含 is_hidden 状态的元素列表
+            "shapes": [...],  // 包含 is_hidden 状态的元素列表
+            "slide_width": 12192000,  // 可选，EMU；不传时从 PPT 读取
+            "slide_height": 6858000
         }
 
     Response:
         {"success": true, "image_url": "/media/..."}
     """
-    try:
-        import json
-        import logging
-        from .utils import annotate_screenshot
-
-        logger = logging.getLogger(__name__)
-
-        data = json.loads(request.body)
-        template_id = data.get("template_id")
-        page_num = data.get("page_num")
-        shapes = data.get("shapes", [])
-
-        # 调试日志
-        hidden_shapes = [s for s in shapes if s.get("is_hidden")]
-        logger.info(
-            f"[refresh_preview] page={page_num}, total={len(shapes)}, hidden={len(hidden_shapes)}"
-        )
-        for s in hidden_shapes:
-            logger.info(f"  隐藏元素: {s.get('name')} (id={s.get('shape_id')})")
-
-        if not all([template_id, page_num is not None]):
-            return JsonResponse({"error": "缺少必要参数"}, status=400)
-
-        # 获取原始截图路径（图片在 images 子目录中）
-        template_path = settings.MEDIA_ROOT / "template_editor" / template_id
-        images_dir = template_path / "images"
-        original_image = images_dir / f"page_{page_num}.png"
-
-        logger.info(f"[refresh_preview] 查找图片: {original_image}")
-
-        if not original_image.exists():
-            return JsonResponse(
-                {"error": f"找不到页面 {page_num} 的截图: {original_image}"}, status=404
-            )
+    data = json.loads(request.body)
+    template_id = data.get("template_id")
+    page_num = data.get("page_num")
+    shapes = data.get("shapes", [])
+
+    # 调试日志
+    hidden_shapes = [s for s in shapes if s.get("is_hidden")]
+    logger.info(
+        "[refresh_preview] page=%s, total=%d, hidden=%d",
+        page_num,
+        len(shapes),
+        len(hidden_shapes),
+    )
+    for s in hidden_shapes:
+        logger.info("  隐藏元素: %s (id=%s)", s.get("name"), s.get("shape_id"))
 
-        # 获取 PPT 文件以获取幻灯片尺寸
-        ppt_files = list(template_path.glob("*.pptx"))
-        if not ppt_files:
-            return JsonResponse({"error": "找不到 PPT 文件"}, status=404)
+    if not all([template_id, page_num is not None]):
+        return FastJsonResponse({"error": "缺少必要参数"}, status=400)
 
-        from pptx import Presentation
+    # 获取原始截图路径（图片在 images 子目录中）
+    template_path = settings.MEDIA_ROOT / "template_editor" / template_id
+    images_dir = template_path / "images"
+    original_image = images_dir / f"page_{page_num}.png"
 
-        prs = Presentation(str(ppt_files[0]))
-        slide_width = prs.slide_width
-        slide_height = prs.slide_height
+    logger.info("[refresh_preview] 查找图片: %s", original_image)
 
-        # 重新生成标注图片
-        annotated_path = annotate_screenshot(
-            original_image,
-            shapes,
-            slide_width=slide_width,
-            slide_height=slide_height,
+    if not original_image.exists():
+        return FastJsonResponse(
+            {"error": f"找不到页面 {page_num} 的截图: {original_image}"}, status=404
         )
 
-        # 生成相对 URL
-        relative_path = annotated_path.relative_to(settings.MEDIA_ROOT)
-        image_url = f"/media/{relative_path}"
-
-        return JsonResponse({"success": True, "image_url": image_url})
+    # 幻灯片尺寸：编辑器在解析/恢复时已拿到，随请求传回；缺失时才读取 PPT
+    slide_width = data.get("slide_width")
+    slide_height = data.get("slide_height")
+    if not (
+        isinstance(slide_width, int)
+        and isinstance(slide_height, int)
+        and slide_width > 0
+        and slide_height > 0
+    ):
+        ppt_file = _resolve_pptx(template_id)
+        if ppt_file is None:
+            return FastJsonResponse({"error": "找不到 PPT 文件"}, status=404)
+        slide_width, slide_height = _slide_size(ppt_file)
+
+    # 重新生成标注图片
+    annotated_path = annotate_screenshot(
+        original_image,
+        shapes,
+        slide_width=slide_width,
+        slide_height=slide_height,
+    )
 
-    except Exception as e:
-        import traceback
+    # 生成相对 URL
+    relative_path = annotated_path.relative_to(settings.MEDIA_ROOT)
+    image_url = f"/media/{relative_path}"
 
-        return JsonResponse(
-            {"error": str(e), "traceback": traceback.format_exc()}, status=500
-        )
+    return FastJsonResponse({"success": True, "image_url": image_url})
 
 
 @login_required
 @permission_required("ppt_generator.is_developer", raise_exception=True)
 @require_http_methods(["POST"])
+@_json_endpoint
 def ai_auto_name_shapes(request):
     """
     使用多模态 AI 自动为页面元素命名
@@ -1302,13 +1422,6 @@ def ai_auto_name_shapes(request):
             ]
         }
     """
-    import base64
-    import json
-    import mimetypes
-    import os
-    import sys
-    from pathlib import Path
-
     try:
         data = json.loads(request.body)
         template_id = data.get("template_id")
@@ -1319,34 +1432,66 @@ def ai_auto_name_shapes(request):
         wizard_mode = data.get("wizard_mode", False)  # 是否向导模式
 
         if not all([template_id, page_num, image_url, shapes]):
-            return JsonResponse({"error": "缺少必要参数"}, status=400)
+            return FastJsonResponse({"error": "缺少必要参数"}, status=400)
+
+        # 过滤出可见元素（隐藏的元素不显示在图片上也不需要命名）
+        visible_shapes = [s for s in shapes if not s.get("is_hidden")]
+        existing_elements = existing_config.get("elements", [])
+        existing_page_type = existing_config.get("page_type", "")
+        existing_page_note = existing_config.get("page_note", "")
+
+        # 现有配置已经完整（页面信息齐全、每个可见元素都有名称和提示）时无需调用 LLM
+        if (
+            existing_page_type
+            and existing_page_note
+            and len(existing_elements) >= len(visible_shapes)
+            and all(
+                e.get("name") and e.get("hint")
+                for e in existing_elements[: len(visible_shapes)]
+            )
+        ):
+            return FastJsonResponse(
+                {
+                    "success": True,
+                    "named_shapes": [
+                        {
+                            "shape_index": shape.get("shape_index"),
+                            "shape_id": shape.get("shape_id"),
+                            "suggested_name": elem["name"],
+                            "hint": elem["hint"],
+                            "max_chars": elem.get("max_chars"),
+                            "required": elem.get("required", False),
+                        }
+                        for shape, elem in zip(visible_shapes, existing_elements)
+                    ],
+                    "page_type": existing_page_type,
+                    "page_note": existing_page_note,
+                }
+            )
 
         # 获取 LLM 配置
         llm_provider = data.get("llm_provider")
         llm_model = data.get("llm_model")
+        llm_api_key = None
 
         # 如果没有指定，使用多模态默认配置
         if not llm_provider:
-            from .models import GlobalLLMConfig
-
             # 优先使用多模态默认配置
             multimodal_config = GlobalLLMConfig.get_multimodal_config()
             if multimodal_config:
                 llm_provider = multimodal_config.llm_provider
                 # 使用 get_model_for_provider() 获取正确的模型名
                 llm_model = llm_model or multimodal_config.get_model_for_provider()
-                # 设置 API Key
-                if multimodal_config.llm_api_key:
-                    if llm_provider == "glm":
-                        os.environ["GLM_API_KEY"] = multimodal_config.llm_api_key
-                    elif llm_provider == "taichu":
-                        os.environ["TAICHU_API_KEY"] = multimodal_config.llm_api_key
-
-                print(
-                    f"[AI命名] 使用多模态配置: provider={llm_provider}, model={llm_model}"
+                # API Key 直接传给 LLM 客户端，不写入进程环境变量（并发请求间互不影响）
+                llm_api_key = multimodal_config.llm_api_key or None
+
+                logger.info(
+                    "[AI命名] 使用多模态配置: provider=%s, model=%s",
+                    llm_provider,
+                    llm_model,
                 )
             else:
-                return JsonResponse(
+                return FastJsonResponse(
                     {
                         "error": "未配置多模态 LLM，请先在管理后台配置 glm 或 taichu 模型并设为多模态默认"
                     },
@@ -1360,38 +1505,28 @@ def ai_auto_name_shapes(request):
         clean_image_url = image_url.split("?")[0]  # 移除 ?t=xxx 等参数
         image_path = settings.MEDIA_ROOT / clean_image_url.lstrip("/media/")
         if not image_path.exists():
-            return JsonResponse({"error": f"图片不存在: {clean_image_url}"}, status=404)
+            return FastJsonResponse({"error": f"图片不存在: {clean_image_url}"}, status=404)
 
         # 读取并编码图片
-        with open(image_path, "rb") as f:
-            image_data = f.read()
-        base64_image = base64.b64encode(image_data).decode("utf-8")
-        mime_type, _ = mimetypes.guess_type(str(image_path))
-        if not mime_type:
-            mime_type = "image/png"
-
-        # 过滤出可见元素（隐藏的元素不显示在图片上也不需要命名）
-        visible_shapes = [s for s in shapes if not s.get("is_hidden")]
+        image_data_url = _image_data_url(*_file_key(image_path))
 
         # 构建元素描述（编号与图片上的标注一致，从1开始）
         shapes_desc = []
-        existing_elements = existing_config.get("elements", [])
         for i, shape in enumerate(visible_shapes, 1):
-            desc = f"#{i}: 类型={shape.get('type', '未知')}"
+            parts = [f"#{i}: 类型={shape.get('type', '未知')}"]
             if shape.get("text_sample"):
-                desc += f', 文本预览="{shape["text_sample"][:30]}..."'
+                parts.append(f', 文本预览="{shape["text_sample"][:30]}..."')
             # 添加现有配置信息
             if i <= len(existing_elements):
                 elem = existing_elements[i - 1]
                 if elem.get("name"):
-                    desc += f', 已命名="{elem["name"]}"'
+                    parts.append(f', 已命名="{elem["name"]}"')
                 if elem.get("hint"):
-                    desc += f', 已有提示="{elem["hint"]}"'
-            shapes_desc.append(desc)
+                    parts.append(f', 已有提示="{elem["hint"]}"')
+            shapes_desc.append("".join(parts))
+        shapes_desc_text = "\n".join(shapes_desc)
 
         # 检查是否有现有配置（查漏补缺模式）
-        existing_page_type = existing_config.get("page_type", "")
-        existing_page_note = existing_config.get("page_note", "")
         has_existing = (
             bool(existing_page_type)
             or bool(existing_page_note)
@@ -1435,7 +1570,7 @@ def ai_auto_name_shapes(request):
 - 页面备注: {existing_page_note or "（缺失，需补全）"}
 
 **页面元素**（{len(visible_shapes)} 个）：
-{chr(10).join(shapes_desc)}
+{shapes_desc_text}
 
 **需要补全的内容**：{missing_summary if missing_summary else "检查并补全缺失字段"}
 
@@ -1466,7 +1601,7 @@ def ai_auto_name_shapes(request):
 **页面信息**
 图片上标注了 {len(visible_shapes)} 个可编辑元素（黄色/蓝色编号圈）：
 
-{chr(10).join(shapes_desc)}
+{shapes_desc_text}
 
 **命名原则**
 1. 根据元素的**位置和布局作用**命名，而非具体内容
@@ -1501,20 +1636,20 @@ def ai_auto_name_shapes(request):
 只返回 JSON，不要其他解释。确保 elements 数量与可见元素数量 ({len(visible_shapes)}) 一致。"""
 
         # 初始化 LLM（使用管理后台配置的多模态模型）
-        sys.path.insert(0, str(Path(__file__).parent.parent.parent / "scripts"))
-        from llm_client import GLMLLM, TaichuLLM
+        # 项目根目录已在模块加载时加入 sys.path；LLM 客户端（连带 requests）仍按需导入，不拖慢启动
+        from scripts.llm_client import GLMLLM, TaichuLLM
 
         # llm_model 已从 multimodal_config.llm_model 获取，不再使用硬编码默认值
         if not llm_model:
-            return JsonResponse(
+            return FastJsonResponse(
                 {"error": "未配置多模态模型名称，请在管理后台设置"},
                 status=400,
             )
 
         if llm_provider == "glm":
-            llm = GLMLLM(model=llm_model)
+            llm = GLMLLM(api_key=llm_api_key, model=llm_model)
         else:
-            llm = TaichuLLM(model=llm_model)
+            llm = TaichuLLM(api_key=llm_api_key, model=llm_model)
 
         # 构建多模态消息
         messages = [
@@ -1524,7 +1659,7 @@ def ai_auto_name_shapes(request):
                     {"type": "text", "text": prompt},
                     {
                         "type": "image_url",
-                        "image_url": {"url": f"data:{mime_type};base64,{base64_image}"},
+                        "image_url": {"url": image_data_url},
                     },
                 ],
             }
@@ -1532,12 +1667,12 @@ def ai_auto_name_shapes(request):
 
         # 调用 LLM（不重试，避免加重限流问题）
         try:
-            print(f"[AI命名] 开始调用 {llm_provider} 模型 {llm_model}...")
+            logger.info("[AI命名] 开始调用 %s 模型 %s...", llm_provider, llm_model)
             response = llm.generate(messages)
-            print(f"[AI命名] 调用成功，响应长度: {len(response)}")
+            logger.info("[AI命名] 调用成功，响应长度: %d", len(response))
         except Exception as e:
             error_str = str(e)
-            print(f"[AI命名] 调用失败: {error_str}")
+            logger.warning("[AI命名] 调用失败: %s", error_str)
 
             # 检查是否是限流错误，给出明确提示
             if "429" in error_str or "1302" in error_str or "并发" in error_str:
@@ -1547,39 +1682,12 @@ def ai_auto_name_shapes(request):
             raise
 
         # 解析响应
-        print(f"[AI命名] 原始响应:\n{response[:500]}...")  # 打印前500字符用于调试
+        logger.debug("[AI命名] 原始响应:\n%s...", response[:500])  # 前500字符用于调试
 
         # 提取 JSON 部分
-        json_match = response.strip()
-
-        # 尝试多种方式提取 JSON
-        if "```json" in json_match:
-            json_match = json_match.split("```json")[1].split("```")[0].strip()
-        elif "```" in json_match:
-            # 可能是 ```\n{...}\n```
-            parts = json_match.split("```")
-            for part in parts:
-                part = part.strip()
-                if part.startswith("{") or part.startswith("["):
-                    json_match = part
-                    break
-
-        # 如果还是没找到 JSON，尝试直接找 { 或 [ 开头的内容
-        if not json_match.startswith("{") and not json_match.startswith("["):
-            # 尝试找到第一个 { 或 [
-            start_brace = json_match.find("{")
-            start_bracket = json_match.find("[")
-            if start_brace >= 0 and (start_bracket < 0 or start_brace < start_bracket):
-                # 找到最后一个匹配的 }
-                end_brace = json_match.rfind("}")
-                if end_brace > start_brace:
-                    json_match = json_match[start_brace : end_brace + 1]
-            elif start_bracket >= 0:
-                end_bracket = json_match.rfind("]")
-                if end_bracket > start_bracket:
-                    json_match = json_match[start_bracket : end_bracket + 1]
-
-        print(f"[AI命名] 提取的 JSON:\n{json_match[:300]}...")
+        json_match = _extract_json_text(response)
+
+        logger.debug("[AI命名] 提取的 JSON:\n%s...", json_match[:300])
 
         if not json_match:
             raise json.JSONDecodeError("AI 返回内容为空", response, 0)
@@ -1616,7 +1724,7 @@ def ai_auto_name_shapes(request):
                     }
                 )
 
-        return JsonResponse(
+        return FastJsonResponse(
             {
                 "success": True,
                 "named_shapes": named_shapes,
@@ -1626,21 +1734,55 @@ def ai_auto_name_shapes(request):
         )
 
     except json.JSONDecodeError as e:
-        return JsonResponse(
+        return FastJsonResponse(
             {"error": f"AI 返回格式错误: {str(e)}", "raw_response": response},
             status=500,
         )
-    except Exception as e:
-        import traceback
-
-        return JsonResponse(
-            {"error": str(e), "traceback": traceback.format_exc()}, status=500
-        )
 
 
 # ============ 编辑记录管理 API ============
 
 
+# 编辑记录列表 JSON 的缓存时长（秒）
+_EDIT_SESSIONS_CACHE_TIMEOUT = 300
+
+_EDITOR_TYPE_DISPLAY = dict(TemplateEditSession.EDITOR_TYPE_CHOICES)
+
+
+def _format_minute(value) -> str:
+    """格式化为 "YYYY-MM-DD HH:MM"（isoformat 是 C 实现，比 strftime 快；截掉时区后缀）。"""
+    return value.isoformat(" ", "minutes")[:16]
+
+
+def _edit_session_rows(sessions):
+    """把编辑会话查询集转换为列表接口返回的字典列表（最多20条）。
+
+    用 .values() 直接取字段，不构造模型实例。
+    """
+    rows = sessions.order_by("-updated_at").values(
+        "id",
+        "session_id",
+        "editor_type",
+        "template_name",
+        "progress_data",
+        "thumbnail_url",
+        "created_at",
+        "updated_at",
+    )[:20]  # 最多返回20条
+
+    result = []
+    for row in rows:
+        editor_type = row["editor_type"]
+        row["editor_type_display"] = _EDITOR_TYPE_DISPLAY.get(editor_type, editor_type)
+        row["progress_summary"] = TemplateEditSession.summarize_progress(
+            editor_type, row["progress_data"]
+        )
+        row["created_at"] = _format_minute(row["created_at"])
+        row["updated_at"] = _format_minute(row["updated_at"])
+        result.append(row)
+    return result
+
+
 @login_required
 @permission_required("ppt_generator.is_developer", raise_exception=True)
 @require_http_methods(["GET"])
@@ -1674,31 +1816,24 @@ def list_edit_sessions(request):
     if editor_type:
         sessions = sessions.filter(editor_type=editor_type)
 
-    sessions = sessions.order_by("-updated_at")[:20]  # 最多返回20条
-
-    result = []
-    for session in sessions:
-        result.append(
-            {
-                "id": session.id,
-                "session_id": session.session_id,
-                "editor_type": session.editor_type,
-                "editor_type_display": session.get_editor_type_display(),
-                "template_name": session.template_name,
-                "progress_summary": session.progress_summary,
-                "progress_data": session.progress_data,
-                "thumbnail_url": session.thumbnail_url,
-                "created_at": session.created_at.strftime("%Y-%m-%d %H:%M"),
-                "updated_at": session.updated_at.strftime("%Y-%m-%d %H:%M"),
-            }
-        )
-
-    return JsonResponse({"sessions": result})
+    # 列表内容只随记录增删改变化：用最新更新时间 + 条数作为缓存版本，命中时直接返回序列化好的 JSON
+    stamp = sessions.aggregate(latest=Max("updated_at"), total=Count("id"))
+    latest = stamp["latest"].timestamp() if stamp["latest"] else 0
+    cache_key = (
+        f"s2s:edit_sessions:{request.user.pk}:{quote(editor_type or '', safe='')}"
+        f":{latest}:{stamp['total']}"
+    )
+    body = cache.get(cache_key)
+    if body is None:
+        body = dumps_json({"sessions": _edit_session_rows(sessions)})
+        cache.set(cache_key, body, _EDIT_SESSIONS_CACHE_TIMEOUT)
+    return HttpResponse(body, content_type="application/json")
 
 
 @login_required
 @permission_required("ppt_generator.is_developer", raise_exception=True)
 @require_http_methods(["POST"])
+@_json_endpoint
 def save_edit_session(request):
     """
     保存/更新编辑会话记录
@@ -1713,40 +1848,50 @@ def save_edit_session(request):
         }
 
     Response:
-        {"success": true, "id": 1}
+        {"success": true, "id": "uuid", "created": false}  // id 为 session_id
     """
-    try:
-        data = json.loads(request.body)
-        session_id = data.get("session_id")
-        editor_type = data.get("editor_type", "ppt")
-        template_name = data.get("template_name", "未命名模板")
-        progress_data = data.get("progress_data", {})
-        thumbnail_url = data.get("thumbnail_url")
-
-        if not session_id:
-            return JsonResponse({"error": "缺少 session_id"}, status=400)
-
-        # 创建或更新
-        session, created = TemplateEditSession.objects.update_or_create(
-            user=request.user,
-            session_id=session_id,
-            defaults={
-                "editor_type": editor_type,
-                "template_name": template_name,
-                "progress_data": progress_data,
-                "thumbnail_url": thumbnail_url,
-            },
-        )
+    data = json.loads(request.body)
+    session_id = data.get("session_id")
+    editor_type = data.get("editor_type", "ppt")
+    template_name = data.get("template_name", "未命名模板")
+    progress_data = data.get("progress_data", {})
+    thumbnail_url = data.get("thumbnail_url")
+
+    if not session_id:
+        return FastJsonResponse({"error": "缺少 session_id"}, status=400)
+
+    fields = {
+        "editor_type": editor_type,
+        "template_name": template_name,
+        "progress_data": progress_data,
+        "thumbnail_url": thumbnail_url,
+    }
+    existing = TemplateEditSession.objects.filter(
+        user=request.user, session_id=session_id
+    )
 
-        return JsonResponse({"success": True, "id": session.id, "created": created})
+    # 自动保存大多是更新已有记录：直接 UPDATE 并按影响行数判断，记录不存在时再 INSERT
+    # （QuerySet.update 不会触发 auto_now，需手动设置 updated_at）
+    if existing.update(**fields, updated_at=timezone.now()):
+        return FastJsonResponse({"success": True, "id": session_id, "created": False})
 
-    except Exception as e:
-        return JsonResponse({"error": str(e)}, status=500)
+    try:
+        with transaction.atomic():
+            TemplateEditSession.objects.create(
+                user=request.user, session_id=session_id, **fields
+            )
+    except IntegrityError:
+        # 并发的另一次保存刚刚创建了同一条记录
+        existing.update(**fields, updated_at=timezone.now())
+        return FastJsonResponse({"success": True, "id": session_id, "created": False})
+
+    return FastJsonResponse({"success": True, "id": session_id, "created": True})
 
 
 @login_required
 @permission_required("ppt_generator.is_developer", raise_exception=True)
 @require_http_methods(["DELETE", "POST"])
+@_json_endpoint
 def delete_edit_session(request, session_id):
     """
     删除编辑会话记录
@@ -1761,19 +1906,14 @@ def delete_edit_session(request, session_id):
 
         # 如果是 PPT 编辑器，同时删除临时文件
         if session.editor_type == "ppt":
-            import shutil
-
-            temp_dir = settings.MEDIA_ROOT / "template_editor" / session_id
-            if temp_dir.exists():
-                shutil.rmtree(temp_dir)
+            enqueue_dir_removal(settings.MEDIA_ROOT / "template_editor" / session_id)
+            _forget_pptx(session_id)
 
         session.delete()
-        return JsonResponse({"success": True})
+        return FastJsonResponse({"success": True})
 
     except TemplateEditSession.DoesNotExist:
-        return JsonResponse({"error": "记录不存在"}, status=404)
-    except Exception as e:
-        return JsonResponse({"error": str(e)}, status=500)
+        return FastJsonResponse({"error": "记录不存在"}, status=404)
 
 
 @login_required
@@ -1800,7 +1940,7 @@ def get_edit_session(request, session_id):
             temp_dir = settings.MEDIA_ROOT / "template_editor" / session_id
             exists = temp_dir.exists()
 
-        return JsonResponse(
+        return FastJsonResponse(
             {
                 "session": {
                     "id": session.id,
@@ -1809,20 +1949,21 @@ def get_edit_session(request, session_id):
                     "template_name": session.template_name,
                     "progress_data": session.progress_data,
                     "thumbnail_url": session.thumbnail_url,
-                    "created_at": session.created_at.strftime("%Y-%m-%d %H:%M"),
-                    "updated_at": session.updated_at.strftime("%Y-%m-%d %H:%M"),
+                    "created_at": _format_minute(session.created_at),
+                    "updated_at": _format_minute(session.updated_at),
                 },
                 "exists": exists,
             }
         )
 
     except TemplateEditSession.DoesNotExist:
-        return JsonResponse({"error": "记录不存在"}, status=404)
+        return FastJsonResponse({"error": "记录不存在"}, status=404)
 
 
 @login_required
 @permission_required("ppt_generator.is_developer", raise_exception=True)
 @require_http_methods(["GET"])
+@_json_endpoint
 def restore_edit_session(request, session_id):
     """
     恢复 PPT 编辑会话 - 重新加载已上传的模板数据
@@ -1830,162 +1971,164 @@ def restore_edit_session(request, session_id):
     Response:
         与 parse_ppt_template 相同的结构
     """
-    try:
-        from .utils import extract_shapes_info, annotate_screenshot
+    # 尝试查找会话（ppt 类型或从向导传入的直接加载）
+    session = TemplateEditSession.objects.filter(
+        user=request.user, session_id=session_id, editor_type="ppt"
+    ).first()
 
-        # 尝试查找会话（ppt 类型或从向导传入的直接加载）
-        session = TemplateEditSession.objects.filter(
-            user=request.user, session_id=session_id, editor_type="ppt"
-        ).first()
+    # 获取 PPT 文件路径
+    template_path = settings.MEDIA_ROOT / "template_editor" / session_id
+    if not template_path.exists():
+        return FastJsonResponse({"error": "编辑会话文件已过期"}, status=404)
 
-        # 获取 PPT 文件路径
-        template_path = settings.MEDIA_ROOT / "template_editor" / session_id
-        if not template_path.exists():
-            return JsonResponse({"error": "编辑会话文件已过期"}, status=404)
+    ppt_path = _resolve_pptx(session_id)
+    if ppt_path is None:
+        return FastJsonResponse({"error": "找不到 PPT 文件"}, status=404)
 
-        ppt_files = list(template_path.glob("*.pptx"))
-        if not ppt_files:
-            return JsonResponse({"error": "找不到 PPT 文件"}, status=404)
+    # 提取元素信息（恢复会话时不做语义过滤，由前端从 progress_data 恢复隐藏状态）
+    shapes_data = _shapes_info(ppt_path, filter_mode="none")
 
-        ppt_path = ppt_files[0]
+    # 获取幻灯片尺寸
+    slide_width = shapes_data.get("slide_width", 12192000)
+    slide_height = shapes_data.get("slide_height", 6858000)
 
-        # 提取元素信息（恢复会话时不做语义过滤，由前端从 progress_data 恢复隐藏状态）
-        shapes_data = extract_shapes_info(ppt_path, filter_mode="none")
+    # 构建页面数据（使用已有的标注图片）
+    images_dir = template_path / "images"
+    pages = []
 
-        # 获取幻灯片尺寸
-        slide_width = shapes_data.get("slide_width", 12192000)
-        slide_height = shapes_data.get("slide_height", 6858000)
+    image_url_prefix = f"/media/template_editor/{session_id}/images/"
+    to_annotate = []  # (pages 下标, 原始图片, 元素列表)
 
-        # 构建页面数据（使用已有的标注图片）
-        images_dir = template_path / "images"
-        pages = []
+    for page_data in shapes_data["pages"]:
+        page_num = page_data["page_num"]
+        image_url = None
 
-        for page_data in shapes_data["pages"]:
-            page_num = page_data["page_num"]
-
-            # 查找已有的标注图片
-            annotated_image = images_dir / f"page_{page_num}_annotated.png"
-            if annotated_image.exists():
-                image_url = f"/media/template_editor/{session_id}/images/page_{page_num}_annotated.png"
-            else:
-                # 如果没有标注图片，使用原始图片重新标注
-                original_image = images_dir / f"page_{page_num}.png"
-                if original_image.exists():
-                    annotated_path = annotate_screenshot(
-                        original_image,
-                        page_data["shapes"],
-                        slide_width,
-                        slide_height,
-                    )
-                    image_url = (
-                        f"/media/template_editor/{session_id}/images/"
-                        + annotated_path.name
-                    )
-                else:
-                    image_url = None
-
-            pages.append(
-                {
-                    "page_num": page_num,
-                    "image_url": image_url,
-                    "shapes": page_data["shapes"],
-                }
-            )
-
-        # 获取模板名称（从 session 或 ppt 文件名）
-        template_name = session.template_name if session else ppt_path.stem
+        # 已有标注图片且不比原始截图旧时直接复用，否则用原始图片重新标注
+        original_image = images_dir / f"page_{page_num}.png"
+        annotated_image = images_dir / f"page_{page_num}_annotated.png"
+        original_mtime = _mtime_or_none(original_image)
+        annotated_mtime = _mtime_or_none(annotated_image)
+        if annotated_mtime is not None and (
+            original_mtime is None or annotated_mtime >= original_mtime
+        ):
+            image_url = image_url_prefix + annotated_image.name
+        elif original_mtime is not None:
+            to_annotate.append((len(pages), original_image, page_data["shapes"]))
 
-        return JsonResponse(
+        pages.append(
             {
-                "template_id": session_id,
-                "template_name": template_name,
-                "ppt_path": str(ppt_path.relative_to(settings.MEDIA_ROOT)),
-                "slide_width": slide_width,
-                "slide_height": slide_height,
-                "pages": pages,
+                "page_num": page_num,
+                "image_url": image_url,
+                "shapes": page_data["shapes"],
             }
         )
-    except Exception as e:
-        import traceback
 
-        return JsonResponse(
-            {"error": str(e), "traceback": traceback.format_exc()}, status=500
-        )
+    # 需要重新标注的页面并行处理
+    annotated_paths = annotate_screenshots(
+        [(image, shapes) for _, image, shapes in to_annotate],
+        slide_width,
+        slide_height,
+    )
+    for (index, _, _), annotated_path in zip(to_annotate, annotated_paths):
+        pages[index]["image_url"] = image_url_prefix + annotated_path.name
+
+    # 获取模板名称（从 session 或 ppt 文件名）
+    template_name = session.template_name if session else ppt_path.stem
+
+    return FastJsonResponse(
+        {
+            "template_id": session_id,
+            "template_name": template_name,
+            "ppt_path": str(ppt_path.relative_to(settings.MEDIA_ROOT)),
+            "slide_width": slide_width,
+            "slide_height": slide_height,
+            "pages": pages,
+        }
+    )
+
+
+@lru_cache(maxsize=256)
+def _cached_template_config(path_str: str, mtime_ns: int, size: int):
+    return json.loads(Path(path_str).read_bytes())
+
+
+def _template_config(json_entry: os.DirEntry):
+    """读取已发布模板的 template.json，文件不存在或解析失败时返回 None。
+
+    按 (路径, mtime, 大小) 缓存解析结果，重新发布后自然失效；返回缓存对象本身，调用方只读不改。
+    """
+    try:
+        st = json_entry.stat()
+        return _cached_template_config(json_entry.path, st.st_mtime_ns, st.st_size)
+    except Exception:
+        return None
+
+
+def _list_template_entries(template_dir: Path) -> dict:
+    """一次 scandir 列出模板目录，返回 {文件名: DirEntry}；目录不存在时返回空 dict。"""
+    try:
+        with os.scandir(template_dir) as it:
+            return {entry.name: entry for entry in it}
+    except OSError:
+        return {}
+
+
+# 向导编辑模式的会话目录里记录创建者用户 id 的文件（该模式不写 TemplateEditSession）
+_SESSION_OWNER_FILE = ".owner"
+
+
+def _is_session_owner(session_dir: Path, user) -> bool:
+    """会话目录由 user 创建时返回 True；目录或标记文件不存在时返回 False。"""
+    try:
+        owner = (session_dir / _SESSION_OWNER_FILE).read_text(encoding="utf-8")
+    except OSError:
+        return False
+    return owner.strip() == str(user.pk)
 
 
 @login_required
 def template_wizard_page(request):
     """模板制作向导页面"""
-    import shutil
-    from .utils import (
-        extract_shapes_info,
-        convert_ppt_to_images,
-        annotate_screenshot,
-    )
-
     # 检查是否是编辑已发布模板的请求
     edit_template = request.GET.get("edit")
     edit_mode_data = None
 
     if edit_template:
-        # 编辑已发布模板模式
-        template_dir = settings.S2S_TEMPLATE_DIR / edit_template
-        pptx_file = template_dir / "template.pptx"
-        json_file = template_dir / "template.json"
+        # 编辑已发布模板模式：一次读出模板目录，后续判断都基于 DirEntry，不再逐个 stat
+        template_entries = _list_template_entries(
+            settings.S2S_TEMPLATE_DIR / edit_template
+        )
+        pptx_entry = template_entries.get("template.pptx")
 
-        if pptx_file.exists():
+        if pptx_entry is not None and pptx_entry.is_file():
             # 创建临时会话目录，复制 PPT 文件
             ppt_session_id = str(uuid.uuid4())
             session_dir = settings.MEDIA_ROOT / "template_editor" / ppt_session_id
             session_dir.mkdir(parents=True, exist_ok=True)
+            (session_dir / _SESSION_OWNER_FILE).write_text(
+                str(request.user.pk), encoding="utf-8"
+            )
 
-            # 复制 PPT 文件
+            # 复制 PPT 文件：会话内会改写元素名称，不能硬链接到已发布模板；
+            # copyfile 在 Linux 上走 sendfile 内核拷贝，且不复制元数据
             ppt_path = session_dir / "template.pptx"
-            shutil.copy2(pptx_file, ppt_path)
-
-            # 生成预览图片（优先 LibreOffice，失败时用 python-pptx）
-            try:
-                # 提取元素信息（编辑已发布模板时不做语义过滤，由前端根据JSON配置设置隐藏）
-                shapes_data = extract_shapes_info(ppt_path, filter_mode="none")
-
-                # 将 PPT 转换为图片
-                images_dir = session_dir / "images"
-                convert_ppt_to_images(ppt_path, images_dir, dpi=150)
-
-                # 获取幻灯片尺寸
-                slide_width = shapes_data.get("slide_width", 12192000)
-                slide_height = shapes_data.get("slide_height", 6858000)
-
-                # 为每个页面生成标注图片
-                for page_data in shapes_data["pages"]:
-                    page_num = page_data["page_num"]
-                    image_path = images_dir / f"page_{page_num}.png"
-                    if image_path.exists():
-                        annotate_screenshot(
-                            image_path,
-                            page_data["shapes"],
-                            slide_width=slide_width,
-                            slide_height=slide_height,
-                        )
-            except Exception as e:
-                print(f"[template_wizard_page] 生成预览图失败: {e}")
+            shutil.copyfile(pptx_entry.path, ppt_path)
+
+            # 预览图（LibreOffice 转换需数秒）交给后台线程生成，页面先返回，前端轮询状态
+            enqueue_template_preview(session_dir, ppt_path)
 
             # 加载 JSON 配置（如果存在）
-            config_data = None
-            if json_file.exists():
-                try:
-                    config_data = json.loads(json_file.read_text(encoding="utf-8"))
-                except Exception:
-                    pass
-
-            edit_mode_data = json.dumps(
+            json_entry = template_entries.get("template.json")
+            config_data = _template_config(json_entry) if json_entry else None
+
+            edit_mode_data = dumps_json(
                 {
                     "template_name": edit_template,
                     "ppt_session_id": ppt_session_id,
                     "config_data": config_data,
                     "is_edit_mode": True,
                 }
-            )
+            ).decode("utf-8")
 
     # 只有通过 URL 参数指定 session 时才恢复会话
     # 直接点击卡片进入时不传 session 参数，开始新的向导
@@ -1994,25 +2137,33 @@ def template_wizard_page(request):
     existing_session = None
     existing_session_json = None
     if session_id and not edit_template:
-        existing_session = TemplateEditSession.objects.filter(
-            user=request.user, session_id=session_id, editor_type="wizard"
-        ).first()
-        # 如果已发布，不恢复
-        if existing_session and existing_session.progress_data.get("published"):
-            existing_session = None
+        # 进度数据直接取数据库中的 JSON 文本拼进页面数据，不再解析成 dict 后重新序列化
+        existing_session = (
+            TemplateEditSession.objects.filter(
+                user=request.user, session_id=session_id, editor_type="wizard"
+            )
+            # 如果已发布，不恢复（带上 has_key，没有 published 键的会话不会因 NULL 比较被排除）
+            .exclude(
+                progress_data__has_key="published", progress_data__published=True
+            )
+            .values("session_id", "template_name", "updated_at")
+            .annotate(progress_json=Cast("progress_data", TextField()))
+            .first()
+        )
 
         # 转换为 JSON 友好的格式
         if existing_session:
-            existing_session_json = json.dumps(
+            progress_json = existing_session["progress_json"]
+            if not progress_json or progress_json == "null":
+                progress_json = "{}"
+            head = dumps_json(
                 {
-                    "session_id": existing_session.session_id,
-                    "template_name": existing_session.template_name,
-                    "updated_at": existing_session.updated_at.strftime(
-                        "%Y-%m-%d %H:%M"
-                    ),
-                    "progress_data": existing_session.progress_data or {},
+                    "session_id": existing_session["session_id"],
+                    "template_name": existing_session["template_name"],
+                    "updated_at": _format_minute(existing_session["updated_at"]),
                 }
-            )
+            ).decode("utf-8")
+            existing_session_json = f'{head[:-1]},"progress_data":{progress_json}}}'
 
     context = {
         "existing_session": existing_session,
@@ -2022,8 +2173,39 @@ def template_wizard_page(request):
     return render(request, "ppt_generator/template_wizard.html", context)
 
 
+@login_required
+@require_http_methods(["GET"])
+def template_preview_status(request, session_id):
+    """
+    查询编辑会话的预览图生成状态
+
+    只能查询自己在向导编辑模式下创建的会话；session_id 不是 UUID 或会话不属于
+    当前用户时与会话不存在一样返回 404。
+
+    Response:
+        {"status": "pending" | "ready" | "failed"}
+    """
+    try:
+        session_id = str(uuid.UUID(session_id))
+    except ValueError:
+        return FastJsonResponse({"error": "编辑会话文件已过期"}, status=404)
+
+    session_dir = settings.MEDIA_ROOT / "template_editor" / session_id
+    status = None
+    if _is_session_owner(session_dir, request.user):
+        status = read_preview_status(session_dir)
+    if status is None:
+        return FastJsonResponse({"error": "编辑会话文件已过期"}, status=404)
+    return FastJsonResponse({"status": status})
+
+
+# 模板名称只允许中文、英文、数字、下划线、横线
+_TEMPLATE_NAME_RE = re.compile(r"^[\u4e00-\u9fa5a-zA-Z0-9_-]+$")
+
+
 @login_required
 @require_http_methods(["POST"])
+@_json_endpoint
 def publish_template(request):
     """
     发布模板到 templates 目录
@@ -2035,115 +2217,98 @@ def publish_template(request):
         "config_data": {...}
     }
     """
-    try:
-        data = json.loads(request.body)
-        template_name = data.get("template_name", "").strip()
-        ppt_session_id = data.get("ppt_session_id")
-        config_data = data.get("config_data")
-        is_edit_mode = data.get("is_edit_mode", False)
-        original_template_name = data.get("original_template_name")
-
-        if not template_name:
-            return JsonResponse({"error": "模板名称不能为空"}, status=400)
-        if not ppt_session_id:
-            return JsonResponse({"error": "缺少 PPT 会话 ID"}, status=400)
-        if not config_data:
-            return JsonResponse({"error": "缺少配置数据"}, status=400)
-
-        # 验证模板名称（只允许中文、英文、数字、下划线、横线）
-        import re
-
-        if not re.match(r"^[\u4e00-\u9fa5a-zA-Z0-9_-]+$", template_name):
-            return JsonResponse(
-                {"error": "模板名称只能包含中文、英文、数字、下划线和横线"}, status=400
+    data = json.loads(request.body)
+    template_name = data.get("template_name", "").strip()
+    ppt_session_id = data.get("ppt_session_id")
+    config_data = data.get("config_data")
+    is_edit_mode = data.get("is_edit_mode", False)
+    original_template_name = data.get("original_template_name")
+
+    if not template_name:
+        return FastJsonResponse({"error": "模板名称不能为空"}, status=400)
+    if not ppt_session_id:
+        return FastJsonResponse({"error": "缺少 PPT 会话 ID"}, status=400)
+    if not config_data:
+        return FastJsonResponse({"error": "缺少配置数据"}, status=400)
+
+    # 验证模板名称（只允许中文、英文、数字、下划线、横线）
+    if not _TEMPLATE_NAME_RE.fullmatch(template_name):
+        return FastJsonResponse(
+            {"error": "模板名称只能包含中文、英文、数字、下划线和横线"}, status=400
+        )
+    # 原模板名会拼进待删除的目录路径，同样在访问文件系统之前校验
+    if original_template_name and not _TEMPLATE_NAME_RE.fullmatch(original_template_name):
+        return FastJsonResponse({"error": "原模板名称无效"}, status=400)
+
+    # 目标目录
+    target_dir = settings.S2S_TEMPLATE_DIR / template_name
+
+    # 编辑模式：允许覆盖原模板
+    if is_edit_mode and original_template_name:
+        # 如果名称改变了，需要检查新名称是否已存在
+        if template_name != original_template_name and target_dir.exists():
+            return FastJsonResponse(
+                {"error": f"模板 '{template_name}' 已存在，请使用其他名称"},
+                status=400,
+            )
+        # 如果名称改变，需要删除原目录
+        if template_name != original_template_name:
+            old_dir = settings.S2S_TEMPLATE_DIR / original_template_name
+            if old_dir.exists():
+                shutil.rmtree(old_dir)
+    else:
+        # 新建模式：不允许覆盖
+        if target_dir.exists():
+            return FastJsonResponse(
+                {"error": f"模板 '{template_name}' 已存在，请使用其他名称"},
+                status=400,
             )
 
-        # 目标目录
-        target_dir = settings.S2S_TEMPLATE_DIR / template_name
-
-        # 编辑模式：允许覆盖原模板
-        if is_edit_mode and original_template_name:
-            # 如果名称改变了，需要检查新名称是否已存在
-            if template_name != original_template_name and target_dir.exists():
-                return JsonResponse(
-                    {"error": f"模板 '{template_name}' 已存在，请使用其他名称"},
-                    status=400,
-                )
-            # 如果名称改变，需要删除原目录
-            if template_name != original_template_name:
-                old_dir = settings.S2S_TEMPLATE_DIR / original_template_name
-                if old_dir.exists():
-                    import shutil as shutil_old
-
-                    shutil_old.rmtree(old_dir)
-        else:
-            # 新建模式：不允许覆盖
-            if target_dir.exists():
-                return JsonResponse(
-                    {"error": f"模板 '{template_name}' 已存在，请使用其他名称"},
-                    status=400,
-                )
-
-        # 获取 PPT 文件路径
-        ppt_source_dir = settings.MEDIA_ROOT / "template_editor" / ppt_session_id
-        ppt_source_path = ppt_source_dir / "template.pptx"
-
-        # 如果 template.pptx 不存在，尝试查找任意 .pptx 文件（兼容旧会话）
-        if not ppt_source_path.exists():
-            ppt_files = list(ppt_source_dir.glob("*.pptx"))
-            if ppt_files:
-                ppt_source_path = ppt_files[0]
-            else:
-                return JsonResponse({"error": "PPT 文件不存在，请重新上传"}, status=400)
-
-        # 创建目标目录
-        target_dir.mkdir(parents=True, exist_ok=True)
-
-        # 复制 PPT 文件
-        import shutil
+    # 获取 PPT 文件路径
+    ppt_source_dir = settings.MEDIA_ROOT / "template_editor" / ppt_session_id
+    ppt_source_path = ppt_source_dir / "template.pptx"
 
-        pptx_target = target_dir / "template.pptx"
-        shutil.copy2(ppt_source_path, pptx_target)
+    # 如果 template.pptx 不存在，尝试查找任意 .pptx 文件（兼容旧会话）
+    if not ppt_source_path.exists():
+        ppt_source_path = _resolve_pptx(ppt_session_id)
+        if ppt_source_path is None:
+            return FastJsonResponse({"error": "PPT 文件不存在，请重新上传"}, status=400)
 
-        # 保存 JSON 配置
-        json_target = target_dir / "template.json"
-        json_target.write_text(
-            json.dumps(config_data, ensure_ascii=False, indent=2), encoding="utf-8"
-        )
+    # 创建目标目录
+    target_dir.mkdir(parents=True, exist_ok=True)
 
-        # 发布成功后清理相关会话记录
-        import shutil as shutil_cleanup
+    # 复制 PPT 文件（copyfile 在 Linux 上走 sendfile，发布的模板不需要保留原文件元数据）
+    pptx_target = target_dir / "template.pptx"
+    shutil.copyfile(ppt_source_path, pptx_target)
 
-        # 删除 wizard 会话
-        wizard_sessions = TemplateEditSession.objects.filter(
-            user=request.user, editor_type="wizard"
-        )
-        wizard_sessions.delete()
+    # 保存 JSON 配置：先写同目录临时文件再 os.replace，读取方不会看到写了一半的文件
+    json_target = target_dir / "template.json"
+    json_tmp = target_dir / f".template.json.{uuid.uuid4().hex}.tmp"
+    try:
+        json_tmp.write_bytes(dumps_json(config_data, indent=True))
+        os.replace(json_tmp, json_target)
+    finally:
+        json_tmp.unlink(missing_ok=True)
 
-        # 删除 PPT 编辑器会话
-        ppt_session = TemplateEditSession.objects.filter(
-            user=request.user, session_id=ppt_session_id
-        ).first()
-        if ppt_session:
-            ppt_session.delete()
+    # 模板目录已变化，首页的模板列表需要重新扫描
+    _invalidate_template_listing()
 
-        # 删除临时文件目录
-        if ppt_source_dir.exists():
-            shutil_cleanup.rmtree(ppt_source_dir)
+    # 发布成功后清理相关会话记录（wizard 会话和本次 PPT 编辑器会话），一条 DELETE 完成
+    TemplateEditSession.objects.filter(
+        Q(editor_type="wizard") | Q(session_id=ppt_session_id), user=request.user
+    ).delete()
 
-        return JsonResponse(
-            {
-                "success": True,
-                "message": f"模板 '{template_name}' 发布成功！",
-                "template_path": str(target_dir),
-                "pptx_path": str(pptx_target),
-                "json_path": str(json_target),
-            }
-        )
+    # 删除临时文件目录（后台执行，不阻塞响应）
+    enqueue_dir_removal(ppt_source_dir)
+    _forget_pptx(ppt_session_id)
 
-    except Exception as e:
-        import traceback
+    return FastJsonResponse(
+        {
+            "success": True,
+            "message": f"模板 '{template_name}' 发布成功！",
+            "template_path": str(target_dir),
+            "pptx_path": str(pptx_target),
+            "json_path": str(json_target),
+        }
+    )
 
-        return JsonResponse(
-            {"error": str(e), "traceback": traceback.format_exc()}, status=500
-        )
@@ -34,6 +34,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "ppt_generator.middleware.IsDeveloperMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -96,7 +97,9 @@ MEDIA_ROOT = BASE_DIR / "media"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # File upload settings
-FILE_UPLOAD_MAX_MEMORY_SIZE = 52428800  # 50MB
+# 超过该大小的上传文件由 Django 直接写入临时文件，而不是整个读入内存；
+# 落盘后的模板/讲稿会被直接移动或原地读取，不再额外复制
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 52428800  # 50MB
 
 # S2S specific settings
@@ -104,6 +107,30 @@ S2S_TEMPLATE_DIR = PROJECT_ROOT / "template"
 S2S_OUTPUT_DIR = PROJECT_ROOT / "output"
 S2S_TEMP_DIR = PROJECT_ROOT / "temp"
 S2S_IMAGES_DIR = PROJECT_ROOT / "images"
+# 同时运行的 PPT 生成任务数（后台线程池大小），超出的任务排队等待。
+# 任务只在进程内排队，进程重启后排队中/生成中的任务会丢失，
+# 启动前运行 `python manage.py fail_orphaned_generations` 把它们标记为失败
+S2S_GENERATION_WORKERS = 2
+# 由 nginx 代发下载文件（X-Accel-Redirect）：本地目录 -> nginx internal location 前缀。
+# 为空时由 Django 自行发送文件。示例：
+#   S2S_ACCEL_REDIRECT_MAP = {S2S_TEMP_DIR: "/protected/temp/", MEDIA_ROOT: "/protected/media/"}
+#   location /protected/temp/ { internal; alias /path/to/S2S/temp/; }
+S2S_ACCEL_REDIRECT_MAP = {}
+
+# 日志：ppt_generator 的 INFO 及以上输出到控制台（原先调试用的 print 已改为 logger）
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "simple": {"format": "%(asctime)s %(levelname)s %(name)s %(message)s"},
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "formatter": "simple"},
+    },
+    "loggers": {
+        "ppt_generator": {"handlers": ["console"], "level": "INFO"},
+    },
+}
 
 # LLM settings
 LLM_PROVIDER = "deepseek"